@@ -0,0 +1,249 @@
+"""
+Cold storage for old chat history.
+
+Messages older than ``CHAT_ARCHIVE_AFTER_DAYS`` are moved out of the message
+table into per-room segment files of up to ``CHAT_ARCHIVE_SEGMENT_SIZE``
+messages: one JSON object per line (with the message's media), compressed
+with zstd when ``zstandard`` is installed and gzip otherwise, and saved
+through the default storage backend. Each segment leaves a
+``MessageArchiveSegment`` row behind that records its file and the
+``(created_at, id)`` range it covers; the messages and their media rows are
+deleted in the same transaction that creates it.
+
+``ChatRoom.history_page`` goes through ``history_window``, which reads hot
+rows first and only touches segments when a page reaches past them.
+Decompressed segments are kept in the cache for
+``CHAT_ARCHIVE_CACHE_TIMEOUT`` seconds. Search documents of archived
+messages are kept, and search resolves them through ``archived_messages``. Archived messages come back as
+unsaved ``Message`` instances with their original ids and ``is_archived``
+set, and their media prefetched, so callers cannot tell the difference
+except that they cannot be saved or deleted.
+"""
+import gzip
+import heapq
+import json
+import logging
+import uuid
+from itertools import islice
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from apps.core.encoding import dumps
+from apps.core.pagination import keyset_window
+from .models import HISTORY_ORDERING, Message, MessageArchiveSegment, MessageMedia
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_CACHE_KEY = 'chat:archive:segment:{}'
+CODEC_EXTENSIONS = {'zstd': 'zst', 'gzip': 'gz'}
+
+
+def compress(data):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'gzip', gzip.compress(data)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd archive segments')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'client_id': str(message.client_id),
+        'sender_id': message.sender_id,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'updated_at': message.updated_at.isoformat(),
+        'media': [
+            {
+                'id': media.id,
+                'file': media.file.name,
+                'media_type': media.media_type,
+                'created_at': media.created_at.isoformat(),
+            }
+            for media in message.media.all()
+        ],
+    }
+
+
+def deserialize_message(room_id, data):
+    message = Message(
+        id=data['id'],
+        room_id=room_id,
+        sender_id=data['sender_id'],
+        client_id=uuid.UUID(data['client_id']),
+        content=data['content'],
+        created_at=parse_datetime(data['created_at']),
+        updated_at=parse_datetime(data['updated_at']),
+    )
+    message.is_archived = True
+    media = [
+        MessageMedia(
+            id=item['id'],
+            message=message,
+            file=item['file'],
+            media_type=item['media_type'],
+            created_at=parse_datetime(item['created_at']),
+        )
+        for item in data['media']
+    ]
+    for item in media:
+        item.is_archived = True
+    message._prefetched_objects_cache = {'media': media}
+    return message
+
+
+def write_segment(room, messages):
+    """Archive ``messages`` (oldest first) into one segment and delete them."""
+    first, last = messages[0], messages[-1]
+    payload = ''.join(dumps(serialize_message(message)) + '\n' for message in messages)
+    codec, data = compress(payload.encode())
+    segment = MessageArchiveSegment(
+        room=room,
+        codec=codec,
+        message_count=len(messages),
+        first_created_at=first.created_at,
+        first_message_id=first.id,
+        last_created_at=last.created_at,
+        last_message_id=last.id,
+    )
+    segment.file.save(
+        f'{room.id}/{first.id}-{last.id}.ndjson.{CODEC_EXTENSIONS[codec]}',
+        ContentFile(data),
+        save=False
+    )
+    try:
+        with transaction.atomic():
+            segment.save()
+            # Raw deletes send no post_delete signals, so the messages stay
+            # searchable (search resolves them through archived_messages)
+            message_ids = [message.id for message in messages]
+            MessageMedia.objects.filter(message_id__in=message_ids)._raw_delete(
+                MessageMedia.objects.db
+            )
+            Message.objects.filter(id__in=message_ids)._raw_delete(Message.objects.db)
+    except Exception:
+        segment.file.delete(save=False)
+        raise
+    return segment
+
+
+def archive_room(room, before, segment_size=None):
+    """Move the room's messages created before ``before`` to cold storage."""
+    segment_size = segment_size or settings.CHAT_ARCHIVE_SEGMENT_SIZE
+    archived = 0
+    while True:
+        messages = list(
+            room.messages.filter(created_at__lt=before)
+            .order_by('created_at', 'id')
+            .prefetch_related('media')[:segment_size]
+        )
+        if not messages:
+            return archived
+        write_segment(room, messages)
+        archived += len(messages)
+        logger.info('Archived %d messages from room %s', len(messages), room.id)
+
+
+def load_segment(segment):
+    """The segment's messages, oldest first."""
+    key = SEGMENT_CACHE_KEY.format(segment.id)
+    raw = cache.get(key)
+    if raw is None:
+        with segment.file.open('rb') as f:
+            raw = decompress(segment.codec, f.read())
+        cache.set(key, raw, settings.CHAT_ARCHIVE_CACHE_TIMEOUT)
+    return [deserialize_message(segment.room_id, json.loads(line)) for line in raw.splitlines()]
+
+
+def archived_messages(wanted):
+    """
+    ``{message_id: Message}`` for archived messages, given
+    ``[(room_id, message_id, created_at)]``.
+    """
+    if not wanted:
+        return {}
+    condition = Q()
+    for room_id, _, created_at in wanted:
+        condition |= Q(
+            room_id=room_id, first_created_at__lte=created_at, last_created_at__gte=created_at
+        )
+    message_ids = {message_id for _, message_id, _ in wanted}
+    found = {}
+    for segment in MessageArchiveSegment.objects.filter(condition):
+        for message in load_segment(segment):
+            if message.id in message_ids:
+                found[message.id] = message
+    return found
+
+
+def _key(message):
+    return (message.created_at, message.id)
+
+
+def archived_window(room, bound, reverse, count):
+    """Like ``keyset_window`` over the room's archive segments."""
+    segments = room.archive_segments.all()
+    if bound is not None:
+        bound = tuple(bound)
+        created_at, message_id = bound
+        if reverse:
+            segments = segments.filter(
+                Q(last_created_at__gt=created_at)
+                | Q(last_created_at=created_at, last_message_id__gt=message_id)
+            )
+        else:
+            segments = segments.filter(
+                Q(first_created_at__lt=created_at)
+                | Q(first_created_at=created_at, first_message_id__lt=message_id)
+            )
+    if reverse:
+        segments = segments.order_by('first_created_at', 'first_message_id')
+    else:
+        segments = segments.order_by('-last_created_at', '-last_message_id')
+
+    rows = []
+    for segment in segments.iterator():
+        messages = load_segment(segment)
+        if bound is not None:
+            if reverse:
+                messages = [m for m in messages if _key(m) > bound]
+            else:
+                messages = [m for m in messages if _key(m) < bound]
+        if not reverse:
+            messages.reverse()
+        rows.extend(messages)
+        if len(rows) >= count:
+            break
+    return rows[:count]
+
+
+def history_window(room, cursor=None, limit=50):
+    """
+    ``keyset_window`` over the room's hot and archived messages combined;
+    pass the result to ``build_page``.
+    """
+    rows, bound, reverse = keyset_window(room.messages.all(), cursor, limit, HISTORY_ORDERING)
+    if len(rows) > limit and not reverse:
+        # Archived messages are all older than anything still hot
+        return rows, cursor, reverse
+    archived = archived_window(room, bound, reverse, limit + 1)
+    if archived:
+        rows = list(islice(heapq.merge(rows, archived, key=_key, reverse=not reverse), limit + 1))
+    return rows, cursor, reverse
@@ -1,16 +1,37 @@
 import json
+import uuid
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
+from django.conf import settings
 from .models import ChatRoom, Message, ChatParticipant
-from apps.notifications.models import Notification
+from .groups import room_group_name
+from .typing import get_typing_state
+from . import viewers
+from .write_behind import get_write_buffer
+from apps.core.encoding import dumps
+from apps.users import presence
+from apps.notifications import unread
+from apps.notifications.tasks import fan_out_chat_message_notifications
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    # The room, the user's ChatParticipant row and its mute state are
+    # resolved once at connect and kept for the life of the socket. They are
+    # reloaded when a 'membership_changed' control message names this user.
+    room = None
+    participant = None
+    is_muted = False
+
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
-        self.room_group_name = f'chat_{self.room_name}'
+        self.room_group_name = room_group_name(self.room_name)
         self.user = self.scope['user']
 
+        if not await self.load_membership():
+            await self.close()
+            return
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -19,15 +40,30 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
+        await sync_to_async(presence.user_connected)(self.user.id, self.channel_name)
+        await sync_to_async(viewers.joined)(self.room.id, self.user.id, self.channel_name)
+
         # Update participant's last read time
         await self.update_last_read()
 
     async def disconnect(self, close_code):
+        if self.room is None:
+            return
+        # Messages received while the room was open were not counted as
+        # unread, so they are read now
+        await self.update_last_read()
+        await self.leave_room()
+
+    async def leave_room(self):
+        await get_typing_state().update(self.room.id, self.user.username, False)
+        await sync_to_async(presence.user_disconnected)(self.user.id, self.channel_name)
+        await sync_to_async(viewers.left)(self.room.id, self.user.id, self.channel_name)
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        self.room = None
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
@@ -35,80 +71,120 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         if message_type == 'chat_message':
             message = text_data_json['message']
-            # Save message to database
-            saved_message = await self.save_message(message)
+            if settings.CHAT_WRITE_BEHIND:
+                # Queue the message and broadcast before it is stored
+                saved_message = await self.buffer_message(
+                    message, text_data_json.get('client_id')
+                )
+            else:
+                # Save message to database
+                saved_message = await self.save_message(message)
             
             # Send message to room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'sender': self.user.username,
-                    'timestamp': timezone.now().isoformat(),
-                    'message_id': saved_message.id
-                }
-            )
+            await self.broadcast({
+                'type': 'chat_message',
+                'message': message,
+                'sender': self.user.username,
+                'timestamp': saved_message.created_at.isoformat(),
+                'message_id': saved_message.id,
+                'client_id': str(saved_message.client_id)
+            })
             
             # Create notifications for other participants
-            await self.create_notifications(saved_message)
+            await self.create_notifications()
             
+        elif message_type == 'heartbeat':
+            await sync_to_async(presence.user_heartbeat)(self.user.id, self.channel_name)
+            await sync_to_async(viewers.heartbeat)(self.room.id, self.user.id, self.channel_name)
+
         elif message_type == 'typing':
-            # Broadcast typing status
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing',
-                    'user': self.user.username,
-                    'is_typing': text_data_json['is_typing']
-                }
+            # Coalesced into periodic per-room typing frames
+            await get_typing_state().update(
+                self.room.id,
+                self.user.username,
+                bool(text_data_json['is_typing'])
             )
 
-    async def chat_message(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': event['message'],
-            'sender': event['sender'],
-            'timestamp': event['timestamp'],
-            'message_id': event['message_id']
-        }))
-
-    async def typing(self, event):
-        # Send typing status to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'typing',
-            'user': event['user'],
-            'is_typing': event['is_typing']
-        }))
+    async def broadcast(self, frame):
+        # Serialize the websocket frame once here; receivers forward it as is
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'broadcast_frame',
+                'text': dumps(frame)
+            }
+        )
+
+    async def broadcast_frame(self, event):
+        await self.send(text_data=event['text'])
+
+    async def membership_changed(self, event):
+        if self.user.id not in event['user_ids']:
+            return
+        if not await self.load_membership():
+            # disconnect() skips a room that was already left
+            await self.leave_room()
+            await self.close()
+
+    @database_sync_to_async
+    def load_membership(self):
+        if not self.user.is_authenticated:
+            return False
+        try:
+            room = ChatRoom.objects.filter(id=self.room_name).first()
+        except ValueError:
+            return False
+        if room is None or not room.participants.filter(id=self.user.id).exists():
+            return False
+        self.room = room
+        self.participant, created = ChatParticipant.objects.get_or_create(
+            user=self.user,
+            room=room
+        )
+        self.is_muted = self.participant.is_muted
+        return True
 
     @database_sync_to_async
     def save_message(self, content):
-        room = ChatRoom.objects.get(id=self.room_name)
         message = Message.objects.create(
-            room=room,
+            room=self.room,
             sender=self.user,
             content=content
         )
         return message
 
+    async def buffer_message(self, content, client_id=None):
+        try:
+            client_id = uuid.UUID(str(client_id))
+        except ValueError:
+            client_id = uuid.uuid4()
+        message = Message(
+            room=self.room,
+            sender=self.user,
+            content=content,
+            client_id=client_id
+        )
+        await get_write_buffer().add(message)
+        return message
+
     @database_sync_to_async
     def update_last_read(self):
-        room = ChatRoom.objects.get(id=self.room_name)
-        participant, created = ChatParticipant.objects.get_or_create(
-            user=self.user,
-            room=room
-        )
-        participant.update_last_read()
+        self.participant.update_last_read()
 
     @database_sync_to_async
-    def create_notifications(self, message):
-        room = message.room
-        participants = room.participants.exclude(id=self.user.id)
-        
-        for participant in participants:
-            Notification.create_chat_message_notification(
-                recipient=participant,
-                sender=self.user,
-                room=room
-            ) 
\ No newline at end of file
+    def count_unread(self):
+        # Users with the room open read the message as it arrives
+        watching = viewers.viewing(self.room.id)
+        unread.messages_sent(self.room.id, [
+            user_id
+            for user_id in self.room.participants.exclude(id=self.user.id)
+            .values_list('id', flat=True)
+            if user_id not in watching
+        ])
+
+    async def create_notifications(self):
+        await self.count_unread()
+        # Fan-out to the other participants runs in a Celery worker
+        await sync_to_async(fan_out_chat_message_notifications.delay)(
+            self.room.id, self.user.id
+        )
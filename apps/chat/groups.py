@@ -0,0 +1,2 @@
+def room_group_name(room_id):
+    return f'chat_{room_id}'
@@ -0,0 +1,37 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.chat.archive import archive_room
+from apps.chat.models import ChatRoom, Message
+
+
+class Command(BaseCommand):
+    help = 'Move old chat messages into compressed archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+            help='Archive messages older than this many days'
+        )
+        parser.add_argument('--room', type=int, help='Only archive this room')
+        parser.add_argument(
+            '--segment-size', type=int, default=settings.CHAT_ARCHIVE_SEGMENT_SIZE
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        rooms = ChatRoom.objects.filter(
+            id__in=Message.objects.filter(created_at__lt=before).values('room_id')
+        )
+        if options['room']:
+            rooms = rooms.filter(id=options['room'])
+
+        total = 0
+        for room in rooms.iterator():
+            archived = archive_room(room, before, options['segment_size'])
+            self.stdout.write(f'room {room.id}: archived {archived} messages')
+            total += archived
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} messages'))
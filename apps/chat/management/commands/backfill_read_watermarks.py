@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.chat.models import ChatParticipant, Message
+
+
+class Command(BaseCommand):
+    help = 'Derive ChatParticipant.last_read_message_id from the legacy last_read timestamps'
+
+    def handle(self, *args, **options):
+        latest_read = Message.objects.filter(
+            room_id=OuterRef('room_id'),
+            created_at__lte=OuterRef('last_read')
+        ).order_by('-id').values('id')[:1]
+
+        updated = ChatParticipant.objects.filter(
+            last_read__isnull=False,
+            last_read_message_id=0
+        ).update(last_read_message_id=Coalesce(Subquery(latest_read), 0))
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {updated} read watermarks'))
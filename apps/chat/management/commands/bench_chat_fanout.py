@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+
+from apps.chat.consumers import ChatConsumer
+from apps.chat.models import ChatRoom
+from apps.core.encoding import dumps, orjson
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure CPU time per fanned-out chat message for a room with many open sockets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receivers', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=50)
+
+    def handle(self, *args, **options):
+        receivers, messages = options['receivers'], options['messages']
+        self.stdout.write(f'JSON encoder: {"orjson" if orjson else "json"}')
+
+        frame = {
+            'type': 'chat_message',
+            'message': 'x' * 200,
+            'sender': 'bench-chat',
+            'timestamp': '2024-01-01T00:00:00+00:00',
+            'message_id': 1,
+            'client_id': '6f1c0a7e-8a53-4c0e-9d5c-2f4b8f7f3b21',
+        }
+        per_receiver = self.cpu(lambda: [json.dumps(dict(frame)) for _ in range(receivers)], messages)
+        once = self.cpu(lambda: dumps(frame), messages)
+        self.stdout.write(f'encode per receiver: {per_receiver * 1000:8.3f} ms CPU/message')
+        self.stdout.write(f'encode once:         {once * 1000:8.3f} ms CPU/message')
+
+        user, _ = User.objects.get_or_create(
+            email='bench-chat@example.com',
+            defaults={'username': 'bench-chat'}
+        )
+        room = ChatRoom.objects.create(name='bench', room_type='group', creator=user)
+        room.participants.add(user)
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        try:
+            with override_settings(CHANNEL_LAYERS=layers, CHAT_WRITE_BEHIND=True,
+                                   CHAT_WRITE_BEHIND_DURABILITY='memory'):
+                cpu, wall = async_to_sync(self.run)(room, user, receivers, messages)
+        finally:
+            room.delete()
+        self.stdout.write(
+            f'end to end ({receivers} sockets): {cpu / messages * 1000:8.3f} ms CPU/message, '
+            f'{wall / messages * 1000:8.3f} ms wall/message'
+        )
+
+    def cpu(self, fn, repeat):
+        started = time.process_time()
+        for _ in range(repeat):
+            fn()
+        return (time.process_time() - started) / repeat
+
+    async def run(self, room, user, receivers, messages):
+        application = URLRouter([
+            path('ws/chat/<str:room_name>/', ChatConsumer.as_asgi()),
+        ])
+        sockets = []
+        for _ in range(receivers):
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{room.id}/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            sockets.append(communicator)
+
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for i in range(messages):
+            await sockets[0].send_json_to({'type': 'chat_message', 'message': f'bench {i}'})
+            await asyncio.gather(*(s.receive_from(timeout=10) for s in sockets))
+        cpu = time.process_time() - cpu_started
+        wall = time.perf_counter() - wall_started
+
+        for communicator in sockets:
+            await communicator.disconnect()
+        return cpu, wall
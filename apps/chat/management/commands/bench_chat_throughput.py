@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+
+from apps.chat.consumers import ChatConsumer
+from apps.chat.models import ChatRoom, Message
+from apps.chat.write_behind import get_write_buffer
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure chat messages/sec through ChatConsumer with and without write-behind'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--clients', type=int, default=4)
+        parser.add_argument('--durability', default='memory', choices=['memory', 'journal'])
+
+    def handle(self, *args, **options):
+        options['messages'] -= options['messages'] % options['clients']
+        user, _ = User.objects.get_or_create(
+            email='bench-chat@example.com',
+            defaults={'username': 'bench-chat'}
+        )
+        room = ChatRoom.objects.create(name='bench', room_type='group', creator=user)
+        room.participants.add(user)
+
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        try:
+            for write_behind in (False, True):
+                with override_settings(
+                    CHANNEL_LAYERS=layers,
+                    CHAT_WRITE_BEHIND=write_behind,
+                    CHAT_WRITE_BEHIND_DURABILITY=options['durability'],
+                ):
+                    elapsed = async_to_sync(self.run)(
+                        room, user, options['messages'], options['clients']
+                    )
+                stored = Message.objects.filter(room=room).count()
+                label = 'write-behind' if write_behind else 'synchronous'
+                self.stdout.write(
+                    f'{label:>13}: {options["messages"] / elapsed:10.1f} msg/s '
+                    f'({stored} stored)'
+                )
+                Message.objects.filter(room=room).delete()
+        finally:
+            room.delete()
+
+    async def run(self, room, user, total, clients):
+        application = URLRouter([
+            path('ws/chat/<str:room_name>/', ChatConsumer.as_asgi()),
+        ])
+        communicators = []
+        for _ in range(clients):
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{room.id}/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            communicators.append(communicator)
+
+        async def send(communicator, count):
+            # Every client is in the room group, so wait for one broadcast
+            # frame per message sent to keep the senders closed-loop.
+            for i in range(count):
+                await communicator.send_json_to({'type': 'chat_message', 'message': f'bench {i}'})
+                await communicator.receive_json_from(timeout=10)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(c, total // clients) for c in communicators))
+        elapsed = time.perf_counter() - started
+
+        await get_write_buffer().flush()
+        for communicator in communicators:
+            await communicator.disconnect()
+        return elapsed
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.models import Message
+from apps.chat.retention import maintain_partitions
+from apps.core import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the chat message table into monthly partitions on created_at '
+        '(PostgreSQL only). Locks the table while rows are copied.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=settings.CHAT_MESSAGE_PARTITIONS_AHEAD,
+            help='Months of empty partitions to create beyond the current one'
+        )
+        parser.add_argument(
+            '--maintain', action='store_true',
+            help='Only run partition maintenance and retention, as the beat task does'
+        )
+
+    def handle(self, *args, **options):
+        if options['maintain']:
+            result = maintain_partitions()
+            self.stdout.write(
+                f"created {result['created']} partitions, dropped {len(result['dropped'])}, "
+                f"deleted {result['deleted']} rows"
+            )
+            return
+        if not partitions.partitions_supported():
+            raise CommandError('Table partitioning requires PostgreSQL')
+        if partitions.convert_to_partitioned(Message, options['ahead']):
+            self.stdout.write(self.style.SUCCESS('Partitioned chat messages'))
+        else:
+            self.stdout.write('Chat messages are already partitioned')
+        for name, start in partitions.list_partitions(Message):
+            self.stdout.write(f'{name}: {start:%Y-%m}')
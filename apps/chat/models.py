@@ -1,8 +1,13 @@
+import uuid
 from django.db import models
+from django.db.models import Max
 from django.utils.translation import gettext_lazy as _
 from apps.users.models import User
+from apps.core.pagination import build_page
 from django.utils import timezone
 
+HISTORY_ORDERING = ('-created_at', '-id')
+
 class ChatRoom(models.Model):
     ROOM_TYPES = [
         ('direct', 'Direct Message'),
@@ -45,6 +50,19 @@ class ChatRoom(models.Model):
         if self.room_type == 'direct' and self.participants.count() > 2:
             self.room_type = 'group'
         super().save(*args, **kwargs)
+    
+    def history_page(self, cursor=None, limit=50):
+        """
+        Scrollback page of messages, oldest first. ``next_cursor`` pages
+        further back in history and ``previous_cursor`` towards the present.
+        Pages reaching past the archive boundary are read from cold storage.
+        """
+        from .archive import history_window
+        messages, next_cursor, previous_cursor = build_page(
+            *history_window(self, cursor, limit), limit, ordering=HISTORY_ORDERING
+        )
+        messages.reverse()
+        return messages, next_cursor, previous_cursor
 
 class Message(models.Model):
     room = models.ForeignKey(
@@ -58,17 +76,47 @@ class Message(models.Model):
         related_name='sent_messages'
     )
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Assigned before the row is written so write-behind messages can be
+    # broadcast and deduplicated ahead of the INSERT.
+    client_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Legacy flag, no longer written. Read state is derived from each
+    # participant's last_read_message_id watermark.
     is_read = models.BooleanField(default=False)
     
     class Meta:
         verbose_name = _('message')
         verbose_name_plural = _('messages')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['room', 'id']),
+            # Keyset pagination for history scrollback
+            models.Index(fields=['room', '-created_at', '-id']),
+        ]
+    
+    # Set on instances loaded from an archive segment (see archive.py)
+    is_archived = False
     
     def __str__(self):
         return f"Message from {self.sender} in {self.room}"
+    
+    def save(self, *args, **kwargs):
+        if self.is_archived:
+            raise ValueError('Archived messages cannot be saved')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        if self.is_archived:
+            raise ValueError('Archived messages cannot be deleted')
+        return super().delete(*args, **kwargs)
+    
+    def seen_by(self):
+        """Participants (other than the sender) who have read this message."""
+        return ChatParticipant.objects.filter(
+            room_id=self.room_id,
+            last_read_message_id__gte=self.id
+        ).exclude(user_id=self.sender_id)
 
 class MessageMedia(models.Model):
     MEDIA_TYPES = [
@@ -89,13 +137,55 @@ class MessageMedia(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     
+    is_archived = False
+    
     class Meta:
         verbose_name = _('message media')
         verbose_name_plural = _('message media')
     
+    def save(self, *args, **kwargs):
+        if self.is_archived:
+            raise ValueError('Archived message media cannot be saved')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        if self.is_archived:
+            raise ValueError('Archived message media cannot be deleted')
+        return super().delete(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.media_type} for {self.message}"
 
+class MessageArchiveSegment(models.Model):
+    """
+    Pointer to a compressed NDJSON file holding a contiguous run of a room's
+    archived messages (see apps/chat/archive.py).
+    """
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='archive_segments'
+    )
+    file = models.FileField(upload_to='chat_archive/')
+    codec = models.CharField(max_length=10)
+    message_count = models.PositiveIntegerField()
+    # (created_at, id) of the oldest and newest message in the segment
+    first_created_at = models.DateTimeField()
+    first_message_id = models.BigIntegerField()
+    last_created_at = models.DateTimeField()
+    last_message_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('message archive segment')
+        verbose_name_plural = _('message archive segments')
+        indexes = [
+            models.Index(fields=['room', '-last_created_at', '-last_message_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.message_count} archived messages in {self.room}"
+
 class ChatParticipant(models.Model):
     user = models.ForeignKey(
         User,
@@ -109,6 +199,9 @@ class ChatParticipant(models.Model):
     )
     joined_at = models.DateTimeField(auto_now_add=True)
     last_read = models.DateTimeField(null=True, blank=True)
+    # Id of the newest message this participant has read; every message in
+    # the room with a greater id is unread.
+    last_read_message_id = models.BigIntegerField(default=0)
     is_muted = models.BooleanField(default=False)
     
     class Meta:
@@ -119,12 +212,36 @@ class ChatParticipant(models.Model):
     def __str__(self):
         return f"{self.user} in {self.room}"
     
-    def update_last_read(self):
-        self.last_read = timezone.now()
-        self.save()
+    def update_last_read(self, message_id=None):
+        latest = message_id is None
+        if latest:
+            message_id = Message.objects.filter(
+                room_id=self.room_id
+            ).aggregate(latest=Max('id'))['latest'] or 0
         
-        # Mark messages as read
-        Message.objects.filter(
-            room=self.room,
-            created_at__lte=self.last_read
-        ).exclude(sender=self.user).update(is_read=True) 
\ No newline at end of file
+        # Only ever move the watermark forward; reconnecting without new
+        # messages writes nothing.
+        now = timezone.now()
+        advanced = ChatParticipant.objects.filter(
+            pk=self.pk,
+            last_read_message_id__lt=message_id
+        ).update(last_read_message_id=message_id, last_read=now)
+        if advanced:
+            from apps.notifications import unread
+            self.last_read_message_id = message_id
+            self.last_read = now
+            unread.room_read(
+                self.user_id,
+                self.room_id,
+                0 if latest else self.unread_count()
+            )
+        return bool(advanced)
+    
+    def unread_messages(self):
+        return Message.objects.filter(
+            room_id=self.room_id,
+            id__gt=self.last_read_message_id
+        ).exclude(sender_id=self.user_id)
+    
+    def unread_count(self):
+        return self.unread_messages().count()
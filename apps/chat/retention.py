@@ -0,0 +1,38 @@
+"""
+Partition maintenance and retention for chat messages.
+
+See ``apps.core.partitions``. ``MessageMedia`` rows point at messages but
+cannot have a database foreign key into the partitioned table, so they are
+deleted explicitly before a month of messages is dropped.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from apps.core import partitions
+from .models import Message, MessageMedia
+
+
+def _delete_media(partition):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(MessageMedia._meta.db_table)} '
+            f'WHERE message_id IN (SELECT id FROM {quote(partition)})'
+        )
+
+
+def maintain_partitions():
+    """Create upcoming partitions and expire messages past the retention period."""
+    created = partitions.ensure_partitions(Message, settings.CHAT_MESSAGE_PARTITIONS_AHEAD)
+    dropped, deleted = [], 0
+    if settings.CHAT_MESSAGE_RETENTION_DAYS:
+        cutoff = timezone.now() - datetime.timedelta(days=settings.CHAT_MESSAGE_RETENTION_DAYS)
+        dropped, deleted = partitions.expire_before(
+            Message, cutoff,
+            batch_size=settings.RETENTION_DELETE_BATCH_SIZE,
+            on_drop=_delete_media
+        )
+    return {'created': created, 'dropped': dropped, 'deleted': deleted}
@@ -0,0 +1,55 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .groups import room_group_name
+from .models import ChatParticipant, ChatRoom
+
+
+def notify_membership_changed(room_id, user_ids):
+    """Tell the room's open sockets to reload the membership of ``user_ids``."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def send():
+        async_to_sync(get_channel_layer().group_send)(
+            room_group_name(room_id),
+            {'type': 'membership_changed', 'user_ids': user_ids}
+        )
+    transaction.on_commit(send)
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_participants = list(instance.participants.values_list('id', flat=True))
+        return
+    if action == 'pre_clear' and reverse:
+        instance._cleared_chat_rooms = list(instance.chat_rooms.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # user.chat_rooms.add/remove/clear(...)
+        room_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_chat_rooms', ())
+        for room_id in room_ids:
+            notify_membership_changed(room_id, [instance.pk])
+    else:
+        user_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_participants', ())
+        notify_membership_changed(instance.pk, user_ids)
+
+
+@receiver(post_save, sender=ChatParticipant)
+def participant_saved(sender, instance, created, **kwargs):
+    # A new row carries default settings, so only updates (e.g. muting) matter
+    if not created:
+        notify_membership_changed(instance.room_id, [instance.user_id])
+
+
+@receiver(post_delete, sender=ChatParticipant)
+def participant_deleted(sender, instance, **kwargs):
+    notify_membership_changed(instance.room_id, [instance.user_id])
@@ -0,0 +1,30 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from config.celery import app
+from .archive import archive_room
+from .models import ChatRoom, Message
+from .retention import maintain_partitions
+from .write_behind import recover_journals
+
+
+@app.task(ignore_result=True)
+def recover_chat_write_behind():
+    return recover_journals()
+
+
+@app.task(ignore_result=True)
+def maintain_message_partitions():
+    return maintain_partitions()
+
+
+@app.task(ignore_result=True)
+def archive_chat_history():
+    before = timezone.now() - datetime.timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS)
+    room_ids = Message.objects.filter(created_at__lt=before).values('room_id')
+    archived = 0
+    for room in ChatRoom.objects.filter(id__in=room_ids).iterator():
+        archived += archive_room(room, before)
+    return archived
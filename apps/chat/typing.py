@@ -0,0 +1,122 @@
+"""
+Coalesced typing indicators.
+
+Clients send a ``typing`` frame on every keystroke. Instead of relaying each
+one to the whole room, typing state is kept per room in a Redis sorted set of
+usernames scored by expiry time, shared by every worker:
+
+* Repeated ``is_typing: true`` frames from a user who is already typing are
+  dropped without any I/O until half of ``CHAT_TYPING_TIMEOUT`` has passed,
+  then the expiry is pushed back once.
+* Only start and stop transitions schedule a room broadcast, and broadcasts
+  are batched: at most one ``{'type': 'typing', 'users': [...]}`` frame per
+  room every ``CHAT_TYPING_BROADCAST_INTERVAL`` seconds, listing everybody
+  currently typing. A frame is only sent if that list changed.
+* Users who stop sending frames expire after ``CHAT_TYPING_TIMEOUT`` seconds;
+  a timer on the worker that saw them type sweeps the set and broadcasts the
+  stop.
+"""
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from apps.core.encoding import dumps
+from config.redis_client import get_async_redis
+from .groups import room_group_name
+
+TYPING_KEY = 'chat:typing:{}'
+TYPING_SENT_KEY = 'chat:typing:{}:sent'
+
+
+class TypingState:
+    def __init__(self, timeout, interval):
+        self.timeout = timeout
+        self.interval = interval
+        self._redis = None
+        # (room_id, username) -> when this worker last pushed the expiry
+        self._refreshed = {}
+        self._scheduled = {}
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def update(self, room_id, username, is_typing):
+        key = (room_id, username)
+        now = time.time()
+        if is_typing:
+            if now - self._refreshed.get(key, 0) < self.timeout / 2:
+                return
+            self._refreshed[key] = now
+            started = await self.redis.zadd(
+                TYPING_KEY.format(room_id), {username: now + self.timeout}
+            )
+            if started:
+                self.schedule(room_id)
+            # Sweep once this user would expire if no further frames arrive
+            self.schedule(room_id, delay=self.timeout + self.interval, sweep=True)
+        else:
+            self._refreshed.pop(key, None)
+            if await self.redis.zrem(TYPING_KEY.format(room_id), username):
+                self.schedule(room_id)
+
+    def schedule(self, room_id, delay=None, sweep=False):
+        slot = (room_id, sweep)
+        if slot in self._scheduled:
+            return
+        loop = asyncio.get_running_loop()
+        self._scheduled[slot] = loop.call_later(
+            self.interval if delay is None else delay,
+            lambda: asyncio.ensure_future(self.flush(room_id, slot))
+        )
+
+    async def flush(self, room_id, slot=None):
+        self._scheduled.pop(slot, None)
+        key = TYPING_KEY.format(room_id)
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zrange(key, 0, -1, withscores=True)
+        removed, typing = await pipe.execute()
+
+        users = sorted(username.decode() for username, _ in typing)
+        payload = dumps(users)
+        # SET ... GET makes sure only one worker sends a given change
+        previous = await self.redis.set(
+            TYPING_SENT_KEY.format(room_id), payload,
+            ex=self.timeout * 4, get=True
+        )
+        if previous is None or previous.decode() != payload:
+            await get_channel_layer().group_send(
+                room_group_name(room_id),
+                {
+                    'type': 'broadcast_frame',
+                    'text': dumps({'type': 'typing', 'users': users})
+                }
+            )
+
+        if typing:
+            # Keep sweeping while anyone seen by this worker may still expire
+            local = {username for (room, username) in self._refreshed if room == room_id}
+            if local.intersection(users):
+                next_expiry = min(score for _, score in typing)
+                self.schedule(room_id, delay=max(next_expiry - now, 0) + self.interval, sweep=True)
+        for entry in [k for k in self._refreshed if k[0] == room_id and k[1] not in users]:
+            del self._refreshed[entry]
+
+
+_state = None
+
+
+def get_typing_state():
+    global _state
+    if _state is None:
+        _state = TypingState(
+            settings.CHAT_TYPING_TIMEOUT,
+            settings.CHAT_TYPING_BROADCAST_INTERVAL,
+        )
+    return _state
@@ -0,0 +1,47 @@
+"""
+Who currently has a room open.
+
+Each open socket is a member ``"{user_id}:{channel_name}"`` of a per-room
+Redis sorted set, scored by when it expires. Sockets refresh their entry on
+every heartbeat and remove it on disconnect, and sockets that die without
+disconnecting drop out after ``PRESENCE_TTL`` seconds. Unread room counters
+are not incremented for users who are watching the room, and the read
+watermark of a viewer is advanced when their socket closes.
+"""
+import time
+
+from django.conf import settings
+
+from config.redis_client import get_redis
+
+VIEWERS_KEY = 'chat:viewers:{}'
+
+
+def _member(user_id, channel_name):
+    return f'{user_id}:{channel_name}'
+
+
+def joined(room_id, user_id, channel_name):
+    key = VIEWERS_KEY.format(room_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(key, {_member(user_id, channel_name): time.time() + settings.PRESENCE_TTL})
+    pipe.expire(key, settings.PRESENCE_TTL)
+    pipe.execute()
+
+
+# A heartbeat pushes the expiry back exactly like joining does
+heartbeat = joined
+
+
+def left(room_id, user_id, channel_name):
+    get_redis().zrem(VIEWERS_KEY.format(room_id), _member(user_id, channel_name))
+
+
+def viewing(room_id):
+    """Ids of the users with a live socket on the room."""
+    key = VIEWERS_KEY.format(room_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zremrangebyscore(key, '-inf', time.time())
+    pipe.zrange(key, 0, -1)
+    _, members = pipe.execute()
+    return {int(member.split(b':', 1)[0]) for member in members}
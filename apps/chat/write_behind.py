@@ -0,0 +1,232 @@
+"""
+Write-behind persistence for chat messages.
+
+With ``CHAT_WRITE_BEHIND`` enabled the consumer no longer waits for an INSERT
+before broadcasting. Each message gets its ``client_id`` (a UUID, optionally
+supplied by the client) up front, is handed to the process-wide
+``MessageWriteBuffer`` and is broadcast straight away. The buffer writes
+pending messages with a single ``bulk_create`` once
+``CHAT_WRITE_BEHIND_BATCH_SIZE`` messages are queued or
+``CHAT_WRITE_BEHIND_FLUSH_INTERVAL`` seconds after the first one arrived.
+
+Durability is selected with ``CHAT_WRITE_BEHIND_DURABILITY``:
+
+``'memory'``
+    Pending messages live only in the worker's memory. They are flushed on
+    a clean interpreter exit, but a crashed worker loses up to one batch
+    (at most ``BATCH_SIZE`` messages or ``FLUSH_INTERVAL`` seconds worth).
+
+``'journal'``
+    Every message is appended to a per-worker Redis list before it is
+    broadcast, and the list is trimmed only after the batch is committed.
+    Workers refresh a liveness key with ``CHAT_WRITE_BEHIND_JOURNAL_TTL``;
+    the ``recover_chat_write_behind`` task replays the journals of workers
+    whose key has expired. Nothing that was broadcast is lost unless Redis
+    itself loses the write.
+
+Inserts use ``ignore_conflicts`` on the unique ``client_id`` so replaying a
+journal, or a client retransmitting a frame, never stores a message twice.
+(On a partitioned table the constraint is ``(client_id, created_at)``; that
+is equivalent here because ``created_at`` is stamped before journaling.)
+Messages that were broadcast but not yet flushed have no primary key; they
+are identified by ``client_id`` until they land.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import uuid
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from config.redis_client import get_async_redis, get_redis
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_REGISTRY_KEY = 'chat:write_behind:journals'
+
+
+def journal_alive_key(journal_key):
+    return f'{journal_key}:alive'
+
+
+def serialize_message(message):
+    return json.dumps({
+        'client_id': str(message.client_id),
+        'room_id': message.room_id,
+        'sender_id': message.sender_id,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+    })
+
+
+def deserialize_message(raw):
+    data = json.loads(raw)
+    return Message(
+        client_id=uuid.UUID(data['client_id']),
+        room_id=data['room_id'],
+        sender_id=data['sender_id'],
+        content=data['content'],
+        created_at=parse_datetime(data['created_at']),
+    )
+
+
+def write_messages(messages):
+    """
+    Insert ``messages`` in one statement, falling back to row-by-row inserts
+    so that a single bad row (e.g. a deleted room) cannot sink the batch.
+    """
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, ignore_conflicts=True)
+        index_messages(messages)
+        return len(messages)
+    except IntegrityError:
+        logger.warning('Chat write-behind batch failed, retrying row by row')
+
+    written = 0
+    for message in messages:
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message], ignore_conflicts=True)
+            written += 1
+        except IntegrityError:
+            logger.exception('Dropping unwritable chat message %s', message.client_id)
+    index_messages(messages)
+    return written
+
+
+def index_messages(messages):
+    """
+    ``bulk_create`` sends no signals, so index the written rows here. The
+    rows are already committed: a search failure must not fail the flush,
+    or the batch would be written again and the journal never trimmed.
+    """
+    from apps.search.indexing import index_objects
+    try:
+        index_objects('message', Message.objects.filter(
+            client_id__in=[message.client_id for message in messages]
+        ))
+    except Exception:
+        logger.exception('Failed to index %d chat messages', len(messages))
+
+
+class MessageWriteBuffer:
+    def __init__(self, batch_size, flush_interval, durability):
+        if durability not in ('memory', 'journal'):
+            raise ValueError(f'Unknown write-behind durability: {durability!r}')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.pending = []
+        self.journal_key = 'chat:write_behind:{}:{}:{}'.format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8]
+        )
+        self._redis = None
+        self._timer = None
+        # Journal order must match ``pending`` order so that trimming the
+        # head of the journal after a flush removes exactly that batch.
+        self._add_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+
+    async def add(self, message):
+        async with self._add_lock:
+            if self.durability == 'journal':
+                await self._journal(message)
+            self.pending.append(message)
+
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        async with self._flush_lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            try:
+                written = await database_sync_to_async(write_messages)(batch)
+            except Exception:
+                # Keep the batch (and the journal) intact and try again later.
+                logger.exception('Chat write-behind flush failed')
+                self.pending = batch + self.pending
+                if self._timer is None:
+                    loop = asyncio.get_running_loop()
+                    self._timer = loop.call_later(self.flush_interval, self._on_timer)
+                return 0
+            if self.durability == 'journal':
+                await self._redis.ltrim(self.journal_key, len(batch), -1)
+            return written
+
+    async def _journal(self, message):
+        if self._redis is None:
+            self._redis = get_async_redis()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.sadd(JOURNAL_REGISTRY_KEY, self.journal_key)
+        pipe.rpush(self.journal_key, serialize_message(message))
+        pipe.set(
+            journal_alive_key(self.journal_key), 1,
+            ex=settings.CHAT_WRITE_BEHIND_JOURNAL_TTL
+        )
+        await pipe.execute()
+
+    def flush_sync(self):
+        """Best-effort flush for interpreter shutdown, outside the event loop."""
+        batch, self.pending = self.pending, []
+        if batch:
+            write_messages(batch)
+            if self.durability == 'journal':
+                get_redis().ltrim(self.journal_key, len(batch), -1)
+
+
+_buffer = None
+
+
+def get_write_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = MessageWriteBuffer(
+            batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+            durability=settings.CHAT_WRITE_BEHIND_DURABILITY,
+        )
+        atexit.register(_buffer.flush_sync)
+    return _buffer
+
+
+def recover_journals():
+    """
+    Replay the journals of workers that stopped refreshing their liveness
+    key. Returns the number of messages written.
+    """
+    client = get_redis()
+    recovered = 0
+    for journal_key in client.smembers(JOURNAL_REGISTRY_KEY):
+        journal_key = journal_key.decode()
+        if client.exists(journal_alive_key(journal_key)):
+            continue
+        entries = client.lrange(journal_key, 0, -1)
+        if entries:
+            recovered += write_messages([deserialize_message(raw) for raw in entries])
+            logger.info('Recovered %d chat messages from %s', len(entries), journal_key)
+        pipe = client.pipeline()
+        pipe.delete(journal_key)
+        pipe.srem(JOURNAL_REGISTRY_KEY, journal_key)
+        pipe.execute()
+    return recovered
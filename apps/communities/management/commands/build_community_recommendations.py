@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.communities import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute community similarities and every user\'s community recommendations'
+
+    def handle(self, *args, **options):
+        users = recommendations.build()
+        self.stdout.write(self.style.SUCCESS(f'Stored recommendations for {users} users'))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from apps.users.models import User
+from apps.core.counters import register_m2m_counter
 
 class Community(models.Model):
     name = models.CharField(_('name'), max_length=100)
@@ -50,13 +51,17 @@ class Community(models.Model):
             self.slug = self.name.lower().replace(' ', '-')
         super().save(*args, **kwargs)
     
+    # member_count and post_count are maintained by counter caches (see
+    # apps.core.counters); these recount from scratch.
     def update_member_count(self):
         self.member_count = self.members.count()
-        self.save()
+        self.save(update_fields=['member_count'])
     
     def update_post_count(self):
         self.post_count = self.posts.count()
-        self.save()
+        self.save(update_fields=['post_count'])
+
+register_m2m_counter(Community, 'member_count', 'members')
 
 class CommunityCategory(models.Model):
     name = models.CharField(_('name'), max_length=50)
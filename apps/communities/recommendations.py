@@ -0,0 +1,172 @@
+"""
+Community recommendations from co-membership.
+
+A nightly batch builds the binary user x community membership matrix ``M``
+and the co-membership counts ``C = M.T @ M``. It turns them into item-item
+similarities, either cosine (``C_ij / sqrt(n_i * n_j)``) or Jaccard
+(``C_ij / (n_i + n_j - C_ij)``) as chosen by
+``COMMUNITY_RECS_SIMILARITY``, and keeps the ``COMMUNITY_RECS_NEIGHBORS``
+most similar communities of each community in a Redis sorted set. Each
+user's recommendations are the sum of the neighbour lists of the
+communities they belong to, minus those they already joined. The top
+``COMMUNITY_RECS_TOP_N`` are stored in a sorted set per user.
+
+Joining or leaving recomputes that one user from the stored neighbour lists
+(one pipelined read per community they belong to), so suggestions react
+immediately. The similarities themselves only move with the nightly batch.
+
+Private communities are never suggested, and premium ones only with
+``COMMUNITY_RECS_INCLUDE_PREMIUM``. This is checked when suggestions are
+computed and again when they are read. Users with no memberships get the
+largest eligible communities.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+
+from config.redis_client import get_redis
+from .models import Community
+
+SIMILAR_KEY = 'community_recs:similar:{}'
+USER_KEY = 'community_recs:user:{}'
+
+
+def eligible_communities():
+    communities = Community.objects.filter(is_private=False)
+    if not settings.COMMUNITY_RECS_INCLUDE_PREMIUM:
+        communities = communities.filter(is_premium=False)
+    return communities
+
+
+def similarity_matrix(memberships, method='cosine'):
+    """Item-item similarity (communities x communities) of a user x community matrix."""
+    co = (memberships.T @ memberships).tocoo()
+    sizes = np.asarray(memberships.sum(axis=0)).ravel()
+    off_diagonal = co.row != co.col
+    rows, cols, counts = co.row[off_diagonal], co.col[off_diagonal], co.data[off_diagonal]
+    if method == 'jaccard':
+        scores = counts / (sizes[rows] + sizes[cols] - counts)
+    elif method == 'cosine':
+        scores = counts / np.sqrt(sizes[rows] * sizes[cols])
+    else:
+        raise ValueError(f'Unknown similarity: {method!r}')
+    return sparse.csr_matrix((scores.astype(np.float32), (rows, cols)), shape=co.shape)
+
+
+def top_neighbours(similarity, k):
+    """``[(columns, scores)]`` of the ``k`` largest entries of every row."""
+    neighbours = []
+    for row in range(similarity.shape[0]):
+        begin, end = similarity.indptr[row], similarity.indptr[row + 1]
+        columns, scores = similarity.indices[begin:end], similarity.data[begin:end]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            columns, scores = columns[best], scores[best]
+        neighbours.append((columns, scores))
+    return neighbours
+
+
+def build():
+    """Recompute community similarities and every user's recommendations."""
+    pairs = np.array(
+        list(Community.members.through.objects.values_list('user_id', 'community_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    eligible = set(eligible_communities().values_list('id', flat=True))
+    user_ids, user_rows = np.unique(pairs[:, 0], return_inverse=True)
+    community_ids, community_cols = np.unique(pairs[:, 1], return_inverse=True)
+    memberships = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (user_rows, community_cols)),
+        shape=(len(user_ids), len(community_ids))
+    )
+    memberships.data[:] = 1
+
+    similarity = similarity_matrix(memberships, settings.COMMUNITY_RECS_SIMILARITY)
+    # Only eligible communities may appear as neighbours
+    allowed = np.isin(community_ids, list(eligible)).astype(np.float32)
+    similarity = (similarity @ sparse.diags(allowed)).tocsr()
+    similarity.eliminate_zeros()
+
+    neighbour_lists = top_neighbours(similarity, settings.COMMUNITY_RECS_NEIGHBORS)
+    client = get_redis()
+    pipe = client.pipeline()
+    for community_id, (columns, scores) in zip(community_ids.tolist(), neighbour_lists):
+        key = SIMILAR_KEY.format(community_id)
+        pipe.delete(key)
+        if len(columns):
+            pipe.zadd(key, dict(zip(community_ids[columns].tolist(), scores.tolist())))
+    pipe.execute()
+
+    # Per-user scores are M @ S restricted to the stored neighbours
+    neighbour_rows, neighbour_cols, neighbour_scores = [], [], []
+    for row, (columns, scores) in enumerate(neighbour_lists):
+        neighbour_rows += [row] * len(columns)
+        neighbour_cols += columns.tolist()
+        neighbour_scores += scores.tolist()
+    neighbours = sparse.csr_matrix(
+        (neighbour_scores, (neighbour_rows, neighbour_cols)), shape=similarity.shape
+    )
+    top_n = settings.COMMUNITY_RECS_TOP_N
+    batch_size = settings.COMMUNITY_RECS_BATCH_SIZE
+    for start in range(0, len(user_ids), batch_size):
+        batch = memberships[start:start + batch_size]
+        scores = (batch @ neighbours).tocsr()
+        pipe = client.pipeline()
+        for offset in range(batch.shape[0]):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            joined = batch.indices[batch.indptr[offset]:batch.indptr[offset + 1]]
+            keep = ~np.isin(columns, joined)
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_n:
+                best = np.argpartition(-values, top_n - 1)[:top_n]
+                columns, values = columns[best], values[best]
+            key = USER_KEY.format(user_ids[start + offset])
+            pipe.delete(key)
+            if len(columns):
+                pipe.zadd(key, dict(zip(community_ids[columns].tolist(), values.tolist())))
+        pipe.execute()
+    return len(user_ids)
+
+
+def update_user(user_id):
+    """Recompute one user's recommendations from the stored neighbour lists."""
+    client = get_redis()
+    joined = list(
+        Community.members.through.objects.filter(user_id=user_id)
+        .values_list('community_id', flat=True)
+    )
+    pipe = client.pipeline(transaction=False)
+    for community_id in joined:
+        pipe.zrange(SIMILAR_KEY.format(community_id), 0, -1, withscores=True)
+    results = pipe.execute() if joined else []
+    scores = {}
+    for neighbours in results:
+        for community_id, score in neighbours:
+            community_id = int(community_id)
+            scores[community_id] = scores.get(community_id, 0) + score
+    for community_id in joined:
+        scores.pop(community_id, None)
+    best = sorted(scores.items(), key=lambda item: -item[1])[:settings.COMMUNITY_RECS_TOP_N]
+
+    key = USER_KEY.format(user_id)
+    pipe = client.pipeline()
+    pipe.delete(key)
+    if best:
+        pipe.zadd(key, dict(best))
+    pipe.execute()
+    return len(best)
+
+
+def recommended_communities(user, limit=10):
+    """Recommended ``Community`` objects for ``user``, best first."""
+    ranked = [
+        int(community_id)
+        for community_id in get_redis().zrevrange(USER_KEY.format(user.id), 0, limit * 2)
+    ]
+    communities = eligible_communities().exclude(members=user)
+    if not ranked:
+        return list(communities.order_by('-member_count', '-id')[:limit])
+    by_id = communities.filter(id__in=ranked).in_bulk()
+    return [by_id[pk] for pk in ranked if pk in by_id][:limit]
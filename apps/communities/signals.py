@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Community
+from .tasks import update_community_recommendations
+
+
+def _update(user_ids):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: [
+        update_community_recommendations.delay(user_id) for user_id in user_ids
+    ])
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def memberships_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _update([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _update(pk_set or ())
+    elif action == 'pre_clear':
+        _update(instance.members.values_list('id', flat=True))
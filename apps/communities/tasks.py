@@ -0,0 +1,12 @@
+from config.celery import app
+from . import recommendations
+
+
+@app.task(ignore_result=True)
+def update_community_recommendations(user_id):
+    return recommendations.update_user(user_id)
+
+
+@app.task(ignore_result=True)
+def build_community_recommendations():
+    return recommendations.build()
@@ -0,0 +1,248 @@
+"""
+Counter caches for denormalized count fields.
+
+A counter is registered once per (model, field) pair and keeps the field in
+step with the rows it counts by applying +/- deltas from model signals,
+instead of re-running ``COUNT(*)`` and saving the whole row:
+
+* ``register_fk_counter`` counts child rows pointing at the owner through a
+  foreign key (``post_save``/``post_delete`` on the child).
+* ``register_m2m_counter`` counts rows of a many-to-many relation
+  (``m2m_changed`` on the through model, in both directions).
+
+By default deltas are applied straight away with one
+``UPDATE ... SET field = field + n`` per distinct delta. With
+``COUNTER_CACHE_BUFFER`` enabled they are accumulated in Redis hashes once the
+surrounding transaction commits and written in bulk by the
+``flush_counter_caches`` task; ``counter_value`` merges pending deltas into
+reads. ``reconcile`` compares every counter with a real count and repairs
+drift (``reconcile_counters`` task and management command).
+
+``register_counter`` registers a counter that is fed by explicit
+``apply()`` calls rather than signals (e.g. ``Post.view_count``); such
+counters can be buffered regardless of ``COUNTER_CACHE_BUFFER`` and have no
+source rows to reconcile against.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from redis.exceptions import ResponseError
+
+from config.redis_client import get_redis
+
+BUFFER_KEY_PREFIX = 'counters'
+
+_counters = {}
+
+
+class Counter:
+    def __init__(self, model, field, count_queryset=None, buffered=None):
+        self.model = model
+        self.field = field
+        # Callable returning a queryset of child rows grouped on ``owner``
+        self.count_queryset = count_queryset
+        # None follows COUNTER_CACHE_BUFFER
+        self.buffered = buffered
+
+    @property
+    def is_buffered(self):
+        if self.buffered is None:
+            return settings.COUNTER_CACHE_BUFFER
+        return self.buffered
+
+    @property
+    def key(self):
+        return f'{self.model._meta.label_lower}.{self.field}'
+
+    @property
+    def buffer_key(self):
+        return f'{BUFFER_KEY_PREFIX}:{self.key}'
+
+    def apply(self, deltas):
+        """Apply ``{owner_pk: delta}``, directly or through the Redis buffer."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        if self.is_buffered:
+            transaction.on_commit(lambda: self._buffer(deltas))
+        else:
+            self.write(deltas)
+
+    def write(self, deltas):
+        by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            by_delta[delta].append(pk)
+        for delta, pks in by_delta.items():
+            self.model.objects.filter(pk__in=pks).update(
+                **{self.field: F(self.field) + delta}
+            )
+
+    def _buffer(self, deltas):
+        pipe = get_redis().pipeline(transaction=False)
+        for pk, delta in deltas.items():
+            pipe.hincrby(self.buffer_key, pk, delta)
+        pipe.execute()
+
+    def pending(self, pk):
+        if not self.is_buffered:
+            return 0
+        return int(get_redis().hget(self.buffer_key, pk) or 0)
+
+    def pending_many(self, pks):
+        pks = list(pks)
+        if not self.is_buffered or not pks:
+            return dict.fromkeys(pks, 0)
+        values = get_redis().hmget(self.buffer_key, pks)
+        return {pk: int(value or 0) for pk, value in zip(pks, values)}
+
+    def flush(self):
+        """Move the buffered deltas into the database. Returns rows touched."""
+        client = get_redis()
+        flushing_key = f'{self.buffer_key}:flushing'
+        # A flush that died half way leaves its hash behind; retry it first.
+        if not client.exists(flushing_key):
+            try:
+                client.rename(self.buffer_key, flushing_key)
+            except ResponseError:
+                # Nothing buffered since the last flush
+                return 0
+        deltas = {
+            int(pk): int(delta)
+            for pk, delta in client.hgetall(flushing_key).items()
+        }
+        with transaction.atomic():
+            self.write(deltas)
+        client.delete(flushing_key)
+        return len(deltas)
+
+    def drifted(self):
+        """Owners whose stored value differs from a fresh count."""
+        actual = (
+            self.count_queryset()
+            .filter(owner=OuterRef('pk'))
+            .order_by()
+            .values('owner')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        return self.model.objects.annotate(
+            actual_count=Coalesce(Subquery(actual), Value(0), output_field=IntegerField())
+        ).exclude(**{self.field: F('actual_count')})
+
+    def reconcile(self):
+        fixed = 0
+        for owner in self.drifted().only('pk').iterator():
+            self.model.objects.filter(pk=owner.pk).update(**{self.field: owner.actual_count})
+            fixed += 1
+        return fixed
+
+
+def register_counter(model, field, buffered=None):
+    """Register a counter on ``model.field`` that is fed by ``Counter.apply``."""
+    counter = Counter(model, field, buffered=buffered)
+    _counters[counter.key] = counter
+    return counter
+
+
+def register_fk_counter(model, field, child_model, fk_name):
+    """Keep ``model.field`` equal to the number of ``child_model`` rows via ``fk_name``."""
+    fk_attname = child_model._meta.get_field(fk_name).attname
+    counter = Counter(
+        model, field,
+        lambda: child_model._base_manager.annotate(owner=F(fk_attname))
+    )
+    _counters[counter.key] = counter
+
+    def on_save(sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            counter.apply({getattr(instance, fk_attname): 1})
+
+    def on_delete(sender, instance, **kwargs):
+        counter.apply({getattr(instance, fk_attname): -1})
+
+    post_save.connect(on_save, sender=child_model, weak=False,
+                      dispatch_uid=f'counter-save-{counter.key}')
+    post_delete.connect(on_delete, sender=child_model, weak=False,
+                        dispatch_uid=f'counter-delete-{counter.key}')
+    return counter
+
+
+def register_m2m_counter(model, field, m2m_field):
+    """Keep ``model.field`` equal to the size of the ``m2m_field`` relation on ``model``."""
+    relation = model._meta.get_field(m2m_field)
+    through = relation.remote_field.through
+    source = relation.m2m_field_name()
+    target = relation.m2m_reverse_field_name()
+    source_attname = f'{source}_id'
+    target_attname = f'{target}_id'
+    counter = Counter(
+        model, field,
+        lambda: through.objects.annotate(owner=F(source_attname))
+    )
+    _counters[counter.key] = counter
+
+    def existing_links(instance, reverse, pk_set):
+        if reverse:
+            links = through.objects.filter(**{target_attname: instance.pk})
+            if pk_set is not None:
+                links = links.filter(**{f'{source_attname}__in': pk_set})
+            return list(links.values_list(source_attname, flat=True))
+        links = through.objects.filter(**{source_attname: instance.pk})
+        if pk_set is not None:
+            links = links.filter(**{f'{target_attname}__in': pk_set})
+        return list(links.values_list(target_attname, flat=True))
+
+    def on_change(sender, instance, action, reverse, pk_set, **kwargs):
+        if action in ('pre_remove', 'pre_clear'):
+            # pk_set for remove lists what was asked for, not what existed,
+            # so capture the links that are actually about to go.
+            instance._counter_removed = getattr(instance, '_counter_removed', {})
+            instance._counter_removed[counter.key] = existing_links(instance, reverse, pk_set)
+            return
+        if action == 'post_add':
+            ids, delta = pk_set or (), 1
+        elif action in ('post_remove', 'post_clear'):
+            ids = getattr(instance, '_counter_removed', {}).pop(counter.key, ())
+            delta = -1
+        else:
+            return
+        if reverse:
+            counter.apply({pk: delta for pk in ids})
+        elif ids:
+            counter.apply({instance.pk: delta * len(ids)})
+
+    m2m_changed.connect(on_change, sender=through, weak=False,
+                        dispatch_uid=f'counter-m2m-{counter.key}')
+    return counter
+
+
+def get_counters():
+    return list(_counters.values())
+
+
+def get_counter(model, field):
+    return _counters[f'{model._meta.label_lower}.{field}']
+
+
+def counter_value(instance, field):
+    """``instance.field`` including deltas still waiting in the buffer."""
+    counter = get_counter(type(instance), field)
+    return getattr(instance, field) + counter.pending(instance.pk)
+
+
+def flush_all():
+    return sum(counter.flush() for counter in get_counters() if counter.is_buffered)
+
+
+def reconcile_all():
+    """Flush pending deltas, then repair drifted counters. Returns ``{key: fixed}``."""
+    flush_all()
+    return {
+        counter.key: counter.reconcile()
+        for counter in get_counters()
+        if counter.count_queryset is not None
+    }
@@ -0,0 +1,48 @@
+"""
+Redis sets of ids waiting to be reprocessed by a batch job.
+
+Ids are kept in a sorted set scored by a sequence number taken when they
+were marked. A job takes a ``snapshot()`` (the ids and the sequence number
+at that moment), does its work, then calls ``done(cutoff)``, which removes
+only entries marked up to the snapshot. An id marked again while the job
+runs gets a newer score and stays pending for the next run.
+"""
+from config.redis_client import get_redis
+
+MARK_SCRIPT = """
+local sequence = redis.call('INCR', KEYS[2])
+for _, member in ipairs(ARGV) do
+    redis.call('ZADD', KEYS[1], sequence, member)
+end
+return sequence
+"""
+
+_mark_script = None
+
+
+class DirtySet:
+    def __init__(self, key):
+        self.key = key
+        self.sequence_key = f'{key}:sequence'
+
+    def mark(self, ids):
+        global _mark_script
+        ids = list(ids)
+        if not ids:
+            return
+        if _mark_script is None:
+            _mark_script = get_redis().register_script(MARK_SCRIPT)
+        _mark_script(keys=[self.key, self.sequence_key], args=ids)
+
+    def members(self):
+        return {int(member) for member in get_redis().zrange(self.key, 0, -1)}
+
+    def snapshot(self):
+        """``(ids, cutoff)``: everything marked so far, and where it ends."""
+        client = get_redis()
+        cutoff = int(client.get(self.sequence_key) or 0)
+        ids = [int(member) for member in client.zrangebyscore(self.key, '-inf', cutoff)]
+        return ids, cutoff
+
+    def done(self, cutoff):
+        get_redis().zremrangebyscore(self.key, '-inf', cutoff)
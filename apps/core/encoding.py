@@ -0,0 +1,17 @@
+"""
+JSON encoding for hot paths. Uses orjson when it is installed and falls back
+to the standard library otherwise; both produce compact output.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize ``obj`` to a JSON ``str``."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
@@ -0,0 +1,55 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from apps.core.pagination import encode_cursor, keyset_page
+from apps.posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Compare OFFSET/COUNT page latency with keyset pagination at increasing depth over Post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        queryset = Post.objects.all()
+        total = queryset.count()
+        self.stdout.write(f'{total} posts, page size {page_size}')
+        self.stdout.write(f'{"page":>8} {"offset ms":>12} {"keyset ms":>12}')
+
+        for page in options['pages']:
+            offset = (page - 1) * page_size
+            if offset >= total:
+                break
+
+            # The keyset cursor for page N is the last row of page N - 1
+            cursor = None
+            if offset:
+                boundary = queryset.order_by('-created_at', '-id').values('created_at', 'id')[offset - 1]
+                cursor = encode_cursor([boundary['created_at'].isoformat(), boundary['id']])
+
+            def offset_page():
+                paginator = Paginator(queryset.order_by('-created_at', '-id'), page_size)
+                list(paginator.page(page).object_list)
+
+            def seek_page():
+                keyset_page(queryset, cursor, page_size)
+
+            self.stdout.write(
+                f'{page:>8} {self.time(offset_page, options["repeat"]):>12.2f} '
+                f'{self.time(seek_page, options["repeat"]):>12.2f}'
+            )
+
+    def time(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.counters import get_counters, reconcile_all
+
+
+class Command(BaseCommand):
+    help = 'Detect and repair drift in counter-cache fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drifted rows, do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            for counter in get_counters():
+                if counter.count_queryset is None:
+                    continue
+                self.stdout.write(f'{counter.key}: {counter.drifted().count()} drifted')
+            return
+
+        for key, fixed in reconcile_all().items():
+            self.stdout.write(f'{key}: fixed {fixed}')
@@ -0,0 +1,211 @@
+"""
+Keyset (seek) pagination on ``(created_at, id)``.
+
+Pages are selected with ``WHERE (created_at, id) < (cursor)`` against a
+composite index instead of ``OFFSET``, so page N costs the same as page 1,
+and no ``COUNT(*)`` is ever run. Cursors are opaque URL-safe strings that
+encode the boundary row and the direction, so clients can page both ways.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, reverse = payload['v'], payload['r']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or not isinstance(reverse, (bool, int)):
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        raise InvalidCursor(cursor)
+    return values, bool(reverse)
+
+
+def _field_value(obj, field):
+    value = getattr(obj, field)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _parse_value(queryset, field, value):
+    try:
+        model_field = queryset.model._meta.get_field(field)
+    except FieldDoesNotExist:
+        return value
+    try:
+        if model_field.get_internal_type() == 'DateTimeField':
+            parsed = parse_datetime(value)
+        else:
+            parsed = model_field.to_python(value)
+    except (TypeError, ValueError, ValidationError):
+        raise InvalidCursor(value)
+    if parsed is None:
+        raise InvalidCursor(value)
+    return parsed
+
+
+def _seek(queryset, ordering, values, forward):
+    """Filter to the rows strictly after ``values`` in ``ordering`` (or before, if not ``forward``)."""
+    fields = [name.lstrip('-') for name in ordering]
+    if len(values) != len(fields):
+        raise InvalidCursor(values)
+    values = [_parse_value(queryset, field, value) for field, value in zip(fields, values)]
+    condition = Q()
+    for i, field in enumerate(fields):
+        descending = ordering[i].startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        clause = Q(**{f'{field}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field: prev_value})
+        condition |= clause
+    # Redundant bound on the leading column keeps this a single index range scan
+    lead_lookup = 'lte' if ordering[0].startswith('-') == forward else 'gte'
+    return queryset.filter(**{f'{fields[0]}__{lead_lookup}': values[0]}).filter(condition)
+
+
+def _reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+def keyset_window(queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING):
+    """
+    Fetch up to ``page_size + 1`` rows past ``cursor`` in scan order (the
+    reverse of ``ordering`` when paging backwards). Returns ``(rows, bound,
+    reverse)`` where ``bound`` is the decoded cursor, for ``build_page``.
+    """
+    ordering = list(ordering)
+    bound, reverse = None, False
+    if cursor:
+        values, reverse = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise InvalidCursor(cursor)
+        fields = [name.lstrip('-') for name in ordering]
+        bound = [_parse_value(queryset, field, value) for field, value in zip(fields, values)]
+        queryset = _seek(queryset, ordering, values, forward=not reverse)
+
+    queryset = queryset.order_by(*(_reverse_ordering(ordering) if reverse else ordering))
+    return list(queryset[:page_size + 1]), bound, reverse
+
+
+def build_page(rows, cursor, reverse, page_size=20, ordering=DEFAULT_ORDERING):
+    """Turn a ``keyset_window`` result into ``(items, next_cursor, previous_cursor)``."""
+    fields = [name.lstrip('-') for name in ordering]
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    if reverse:
+        items.reverse()
+
+    if not items:
+        return items, None, None
+
+    first = [_field_value(items[0], field) for field in fields]
+    last = [_field_value(items[-1], field) for field in fields]
+    if reverse:
+        next_cursor = encode_cursor(last)
+        previous_cursor = encode_cursor(first, reverse=True) if has_more else None
+    else:
+        next_cursor = encode_cursor(last) if has_more else None
+        previous_cursor = encode_cursor(first, reverse=True) if cursor else None
+    return items, next_cursor, previous_cursor
+
+
+def keyset_page(queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING):
+    """
+    Return ``(items, next_cursor, previous_cursor)`` for ``queryset`` in
+    ``ordering``. Either cursor is None when there is nothing in that direction.
+    """
+    rows, _, reverse = keyset_window(queryset, cursor, page_size, ordering)
+    return build_page(rows, cursor, reverse, page_size, ordering)
+
+
+def _has_fields(model, ordering):
+    for name in ordering:
+        try:
+            model._meta.get_field(name.lstrip('-'))
+        except FieldDoesNotExist:
+            return False
+    return True
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination over ``keyset_page``. Views can override the ordering with
+    a ``keyset_ordering`` attribute; it must end in a unique column. Models
+    without the ordering fields fall back to page-number pagination.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 10
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = getattr(view, 'keyset_ordering', DEFAULT_ORDERING)
+        self.fallback = None
+        if not _has_fields(queryset.model, ordering):
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+        try:
+            items, self.next_cursor, self.previous_cursor = keyset_page(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+                ordering=ordering,
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return items
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self._link(self.next_cursor),
+            'previous': self._link(self.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,289 @@
+"""
+Monthly range partitioning by ``created_at`` and time-based retention.
+
+On PostgreSQL a model's table can be converted (once, with the model's
+``partition_*`` management command) into a table partitioned by month on
+``created_at``. Afterwards the maintenance beat tasks keep
+``ahead`` months of empty partitions ready and expire old data by dropping
+whole partitions, which is instant and leaves no dead tuples to vacuum.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+converted table's primary key is ``(id, created_at)`` and a unique field
+``f`` becomes unique on ``(f, created_at)``. Foreign keys *into* the table
+cannot be kept; Django still cascades deletes for them, and
+``drop_partitions_before`` runs an ``on_drop`` hook so callers can clean up
+dependent rows first.
+
+A DEFAULT partition catches rows past the last monthly partition, so inserts
+keep working if the maintenance task falls behind. When the missing month is
+created later, its rows are moved out of the DEFAULT partition first.
+
+Everywhere else (SQLite in development, or before the conversion) the same
+functions fall back to batched ``DELETE`` statements, so callers need not
+care which storage is in use.
+"""
+import datetime
+import logging
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def partitions_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(model):
+    if not partitions_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+            [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model):
+    """``[(name, start)]`` of the monthly partitions, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [model._meta.db_table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            start = datetime.datetime(
+                int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc
+            )
+            partitions.append((name, start))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partition(cursor, table, start):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(partition_name(table, start))} '
+        f'PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)',
+        [start, add_months(start, 1)]
+    )
+
+
+def _create_default_partition(cursor, table):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(default_partition_name(table))} '
+        f'PARTITION OF {quote(table)} DEFAULT'
+    )
+
+
+def _has_default_partition(cursor, table):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [default_partition_name(table)])
+    return cursor.fetchone()[0]
+
+
+def _split_from_default(cursor, table, start):
+    """
+    Create the partition for ``start`` out of the rows the DEFAULT partition
+    holds for that month. A range partition cannot be added while the
+    DEFAULT partition has rows in its range, so they are moved first.
+    """
+    quote = connection.ops.quote_name
+    name, default = partition_name(table, start), default_partition_name(table)
+    end = add_months(start, 1)
+    cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {quote(default)} '
+        f'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+        f'INSERT INTO {quote(name)} SELECT * FROM moved',
+        [start, end]
+    )
+    if cursor.rowcount:
+        logger.warning(
+            'Moved %d rows from %s into %s; partition maintenance fell behind',
+            cursor.rowcount, default, name
+        )
+    cursor.execute(
+        f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [start, end]
+    )
+
+
+def ensure_partitions(model, ahead):
+    """
+    Create the partitions for this month and the next ``ahead`` months, and
+    the DEFAULT partition if it is missing.
+    """
+    if not is_partitioned(model):
+        return 0
+    table = model._meta.db_table
+    current = month_start(timezone.now().astimezone(datetime.timezone.utc))
+    existing = {start for _, start in list_partitions(model)}
+    created = 0
+    with connection.cursor() as cursor:
+        has_default = _has_default_partition(cursor, table)
+        for offset in range(ahead + 1):
+            start = add_months(current, offset)
+            if start not in existing:
+                with transaction.atomic():
+                    if has_default:
+                        _split_from_default(cursor, table, start)
+                    else:
+                        _create_partition(cursor, table, start)
+                created += 1
+        if not has_default:
+            _create_default_partition(cursor, table)
+    return created
+
+
+def drop_partitions_before(model, cutoff, on_drop=None):
+    """
+    Drop every partition whose whole range is older than ``cutoff``.
+    ``on_drop(name)`` runs in the same transaction just before each drop.
+    """
+    quote = connection.ops.quote_name
+    dropped = []
+    for name, start in list_partitions(model):
+        if add_months(start, 1) > cutoff:
+            break
+        with transaction.atomic():
+            if on_drop is not None:
+                on_drop(name)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        logger.info('Dropped partition %s', name)
+        dropped.append(name)
+    return dropped
+
+
+def delete_in_batches(queryset, batch_size=5000):
+    """Delete ``queryset`` a batch at a time so no single statement holds locks for long."""
+    deleted = 0
+    model = queryset.model
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        count, _ = model.objects.filter(pk__in=pks).delete()
+        deleted += count
+
+
+def expire_before(model, cutoff, batch_size=5000, on_drop=None):
+    """
+    Remove rows of ``model`` created before ``cutoff``: whole partitions when
+    the table is partitioned, then a batched DELETE for whatever remains
+    (rows in the partially expired month, or all of them when unpartitioned).
+    """
+    dropped = []
+    if is_partitioned(model):
+        dropped = drop_partitions_before(model, cutoff, on_drop=on_drop)
+    deleted = delete_in_batches(
+        model.objects.filter(created_at__lt=cutoff).order_by(), batch_size
+    )
+    return dropped, deleted
+
+
+def convert_to_partitioned(model, ahead):
+    """
+    Rebuild ``model``'s table as a partitioned table with the same columns,
+    indexes and outgoing foreign keys, and move its rows across. Runs in one
+    transaction and holds an exclusive lock on the table throughout.
+    """
+    if not partitions_supported():
+        raise RuntimeError('Table partitioning requires PostgreSQL')
+    if is_partitioned(model):
+        return False
+
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = f'{table}_unpartitioned'
+    unique_fields = [
+        field for field in model._meta.local_fields
+        if field.unique and not field.primary_key
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN(created_at) FROM {quote(table)}')
+        oldest = cursor.fetchone()[0] or timezone.now()
+
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} '
+            f'(LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY, '
+            f'PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)'
+        )
+        start = month_start(oldest.astimezone(datetime.timezone.utc))
+        last = add_months(month_start(timezone.now().astimezone(datetime.timezone.utc)), ahead)
+        while start <= last:
+            _create_partition(cursor, table, start)
+            start = add_months(start, 1)
+        _create_default_partition(cursor, table)
+
+        columns = ', '.join(quote(field.column) for field in model._meta.local_concrete_fields)
+        cursor.execute(
+            f'INSERT INTO {quote(table)} ({columns}) '
+            f'OVERRIDING SYSTEM VALUE SELECT {columns} FROM {quote(legacy)}'
+        )
+        # A serial (not identity) id keeps using the old table's sequence,
+        # which would be dropped with it
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id'), attidentity FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = 'id'",
+            [legacy, legacy]
+        )
+        sequence, identity = cursor.fetchone()
+        if sequence and not identity:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id')
+        cursor.execute(f'DROP TABLE {quote(legacy)} CASCADE')
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            "COALESCE((SELECT MAX(id) FROM {}), 0) + 1, false)".format(quote(table)),
+            [table]
+        )
+
+        for field in model._meta.local_fields:
+            if field.remote_field and field.db_constraint:
+                target = field.remote_field.model._meta
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} ADD FOREIGN KEY ({quote(field.column)}) '
+                    f'REFERENCES {quote(target.db_table)} ({quote(target.pk.column)}) '
+                    f'DEFERRABLE INITIALLY DEFERRED'
+                )
+            if field.db_index and not field.unique:
+                cursor.execute(f'CREATE INDEX ON {quote(table)} ({quote(field.column)})')
+        for field in unique_fields:
+            cursor.execute(
+                f'CREATE UNIQUE INDEX ON {quote(table)} ({quote(field.column)}, created_at)'
+            )
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in model._meta.indexes:
+                schema_editor.add_index(model, index)
+    return True
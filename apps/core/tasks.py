@@ -0,0 +1,12 @@
+from config.celery import app
+from .counters import flush_all, reconcile_all
+
+
+@app.task(ignore_result=True)
+def flush_counter_caches():
+    return flush_all()
+
+
+@app.task
+def reconcile_counters():
+    return reconcile_all()
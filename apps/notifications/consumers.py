@@ -0,0 +1,41 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from apps.core.encoding import dumps
+from .realtime import unread_counts, user_group_name
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+        # Initial badge count; later changes are pushed
+        await self.send(text_data=dumps({
+            'type': 'unread_count',
+            'unread_count': await self.get_unread_count(),
+        }))
+
+    async def disconnect(self, close_code):
+        if not self.user.is_authenticated:
+            return
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    async def notification_frame(self, event):
+        await self.send(text_data=event['text'])
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return unread_counts([self.user.id])[self.user.id]
@@ -0,0 +1,100 @@
+"""
+Bulk notification fan-out.
+
+Builds one unsaved ``Notification`` per recipient and writes them with a
+single ``bulk_create`` per batch, so notifying a large room costs
+``ceil(N / NOTIFICATION_FANOUT_BATCH_SIZE)`` INSERTs instead of N. For
+coalesced types, recipients who already have an unread notification for the
+same target get that row updated instead, with one UPDATE per batch.
+These helpers are synchronous and are meant to run in a Celery worker
+(see ``apps.notifications.tasks``), not on the websocket receive path.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from apps.chat.models import ChatParticipant
+from . import realtime, unread
+from .models import Notification
+
+
+def chat_message_recipient_ids(room, sender_id):
+    """Ids of the room's participants to notify, skipping muted ones."""
+    muted = ChatParticipant.objects.filter(room=room, is_muted=True).values('user_id')
+    return (
+        room.participants
+        .exclude(id=sender_id)
+        .exclude(id__in=muted)
+        .values_list('id', flat=True)
+    )
+
+
+def bulk_notify(recipient_ids, batch_size=None, **fields):
+    """
+    Create a notification with ``fields`` for every id in ``recipient_ids``.
+    Returns the number of recipients notified.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_FANOUT_BATCH_SIZE
+    coalesced_type = fields.get('notification_type') in Notification.COALESCED_TYPES
+    recipient_ids = iter(recipient_ids)
+    notified = 0
+    while True:
+        batch = [
+            Notification(recipient_id=recipient_id, **fields)
+            for recipient_id in islice(recipient_ids, batch_size)
+        ]
+        if not batch:
+            return notified
+        notified += len(batch)
+        if coalesced_type:
+            batch = coalesce_batch(batch, fields)
+            if not batch:
+                continue
+        try:
+            with transaction.atomic():
+                Notification.objects.bulk_create(batch)
+        except IntegrityError:
+            if not coalesced_type:
+                raise
+            # Lost a race with another event for some recipient; go one by one
+            for notification in batch:
+                Notification.create_or_coalesce(
+                    recipient=notification.recipient, **fields
+                )
+            continue
+        unread.notifications_created(batch)
+        realtime.publish(batch)
+
+
+def coalesce_batch(batch, fields):
+    """
+    Fold the batch into the recipients' existing unread notifications for the
+    same target. Returns the notifications that still need to be inserted.
+    """
+    existing = Notification.objects.filter(
+        recipient_id__in=[n.recipient_id for n in batch],
+        notification_type=fields['notification_type'],
+        target_type=fields.get('target_type'),
+        target_id=fields.get('target_id'),
+        is_read=False,
+    )
+    with transaction.atomic():
+        coalesced = set(existing.select_for_update().values_list('recipient_id', flat=True))
+        if coalesced:
+            existing.filter(recipient_id__in=coalesced).update(
+                **Notification.coalesce_updates(fields['notification_type'], fields['sender'])
+            )
+    if not coalesced:
+        return batch
+    # Coalesced rows are not new, so the unread counts stay as they are
+    realtime.publish(existing.filter(recipient_id__in=coalesced).select_related('sender'))
+    return [n for n in batch if n.recipient_id not in coalesced]
+
+
+def fan_out_chat_message(room, sender):
+    recipient_ids = chat_message_recipient_ids(room, sender.id).iterator()
+    return bulk_notify(
+        recipient_ids,
+        **Notification.chat_message_fields(sender, room)
+    )
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.users.models import User
 
@@ -13,6 +16,9 @@ class Notification(models.Model):
         ('system', 'System Notification'),
     ]
     
+    # Types that are folded into one unread row per (recipient, type, target)
+    COALESCED_TYPES = ['chat_message', 'post_rating', 'post_comment']
+    
     recipient = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,18 +42,50 @@ class Notification(models.Model):
     )
     target_id = models.PositiveIntegerField(null=True, blank=True)
     target_type = models.CharField(max_length=50, null=True, blank=True)
+    # Number of events folded into this notification; sender is the latest
+    count = models.PositiveIntegerField(default=1)
     
     class Meta:
         verbose_name = _('notification')
         verbose_name_plural = _('notifications')
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (apps.core.pagination)
+            models.Index(fields=['recipient', '-created_at', '-id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'notification_type', 'target_type', 'target_id'],
+                condition=Q(is_read=False, notification_type__in=COALESCED_TYPES),
+                name='unique_unread_coalesced_notification'
+            ),
+        ]
     
     def __str__(self):
         return f"Notification for {self.recipient}: {self.message}"
     
     def mark_as_read(self):
+        from . import realtime, unread
+        updated = Notification.objects.filter(
+            pk=self.pk,
+            is_read=False
+        ).update(is_read=True)
         self.is_read = True
-        self.save()
+        if updated:
+            unread.notification_read(self.recipient_id)
+            realtime.publish_unread_count(self.recipient_id)
+    
+    @classmethod
+    def mark_all_as_read(cls, recipient):
+        """Mark every unread notification of ``recipient`` read in one UPDATE."""
+        from . import realtime, unread
+        updated = cls.objects.filter(
+            recipient=recipient,
+            is_read=False
+        ).update(is_read=True)
+        unread.notifications_cleared(recipient.id)
+        realtime.publish_unread_count(recipient.id)
+        return updated
     
     @classmethod
     def create_follow_notification(cls, recipient, sender):
@@ -58,9 +96,78 @@ class Notification(models.Model):
             message=f"{sender.get_full_name()} started following you"
         )
     
+    @classmethod
+    def coalesced_message(cls, notification_type, sender):
+        """
+        Message for a row that already holds ``count`` events and is about to
+        absorb one more from ``sender``, as a database expression.
+        """
+        name = sender.get_full_name()
+        if notification_type == 'chat_message':
+            return Concat(
+                Cast(F('count') + 1, CharField()),
+                Value(f" new messages, latest from {name}"),
+                output_field=CharField()
+            )
+        action = {
+            'post_rating': 'rated your post',
+            'post_comment': 'commented on your post',
+        }[notification_type]
+        return Concat(
+            Value(f"{name} and "),
+            Cast(F('count'), CharField()),
+            Case(
+                When(count=1, then=Value(f" other {action}")),
+                default=Value(f" others {action}"),
+                output_field=CharField()
+            ),
+            output_field=CharField()
+        )
+    
+    @classmethod
+    def coalesce_updates(cls, notification_type, sender):
+        return {
+            'count': F('count') + 1,
+            'sender': sender,
+            'message': cls.coalesced_message(notification_type, sender),
+            'created_at': timezone.now(),
+        }
+    
+    @classmethod
+    def create_or_coalesce(cls, recipient, sender, notification_type, message,
+                           target_id, target_type):
+        """
+        Fold this event into the recipient's unread notification for the same
+        target if there is one, otherwise create it. Coalesced rows move to
+        the top of the inbox and are pushed to the recipient again.
+        """
+        from . import realtime
+        key = {
+            'recipient': recipient,
+            'notification_type': notification_type,
+            'target_type': target_type,
+            'target_id': target_id,
+            'is_read': False,
+        }
+        for _attempt in range(2):
+            updated = cls.objects.filter(**key).update(
+                **cls.coalesce_updates(notification_type, sender)
+            )
+            if updated:
+                notification = cls.objects.filter(**key).select_related('sender').first()
+                realtime.publish([notification])
+                return notification
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(sender=sender, message=message, **key)
+            except IntegrityError:
+                # A concurrent event created the row first; fold into it
+                continue
+        return cls.objects.filter(**key).select_related('sender').first()
+    
     @classmethod
     def create_post_rating_notification(cls, recipient, sender, post):
-        return cls.objects.create(
+        return cls.create_or_coalesce(
             recipient=recipient,
             sender=sender,
             notification_type='post_rating',
@@ -71,7 +178,7 @@ class Notification(models.Model):
     
     @classmethod
     def create_comment_notification(cls, recipient, sender, post):
-        return cls.objects.create(
+        return cls.create_or_coalesce(
             recipient=recipient,
             sender=sender,
             notification_type='post_comment',
@@ -80,15 +187,21 @@ class Notification(models.Model):
             target_type='post'
         )
     
+    @classmethod
+    def chat_message_fields(cls, sender, room):
+        return {
+            'sender': sender,
+            'notification_type': 'chat_message',
+            'message': f"New message from {sender.get_full_name()}",
+            'target_id': room.id,
+            'target_type': 'chat_room',
+        }
+    
     @classmethod
     def create_chat_message_notification(cls, recipient, sender, room):
-        return cls.objects.create(
+        return cls.create_or_coalesce(
             recipient=recipient,
-            sender=sender,
-            notification_type='chat_message',
-            message=f"New message from {sender.get_full_name()}",
-            target_id=room.id,
-            target_type='chat_room'
+            **cls.chat_message_fields(sender, room)
         )
     
     @classmethod
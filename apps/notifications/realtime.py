@@ -0,0 +1,82 @@
+"""
+Push delivery of notifications over the ``ws/notifications/`` socket.
+
+Every connected client joins its user's group; new notifications are sent
+there together with the recipient's unread count, and read-state changes send
+the updated count, so clients never need to poll ``api/notifications/``.
+Frames are encoded once here and forwarded unchanged by
+``NotificationConsumer``.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from apps.core.encoding import dumps
+from . import unread
+
+
+def user_group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def serialize_sender(sender):
+    if sender is None:
+        return None
+    return {
+        'id': sender.id,
+        'username': sender.username,
+        'avatar': sender.avatar.url if sender.avatar else None,
+    }
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'recipient': notification.recipient_id,
+        'notification_type': notification.notification_type,
+        'message': notification.message,
+        'count': notification.count,
+        # Callers set ``sender`` as an instance, so this does not query
+        'sender': serialize_sender(notification.sender),
+        'target_id': notification.target_id,
+        'target_type': notification.target_type,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def unread_counts(user_ids):
+    return unread.notification_counts(user_ids)
+
+
+def _send(user_id, frame):
+    async_to_sync(get_channel_layer().group_send)(
+        user_group_name(user_id),
+        {'type': 'notification_frame', 'text': dumps(frame)}
+    )
+
+
+def publish(notifications):
+    """Push ``notifications`` to their recipients once the transaction commits."""
+    notifications = list(notifications)
+    if not notifications:
+        return
+
+    def send():
+        counts = unread_counts({n.recipient_id for n in notifications})
+        for notification in notifications:
+            _send(notification.recipient_id, {
+                'type': 'notification',
+                'notification': serialize_notification(notification),
+                'unread_count': counts[notification.recipient_id],
+            })
+    transaction.on_commit(send)
+
+
+def publish_unread_count(user_id):
+    def send():
+        _send(user_id, {
+            'type': 'unread_count',
+            'unread_count': unread_counts([user_id])[user_id],
+        })
+    transaction.on_commit(send)
@@ -0,0 +1,43 @@
+"""
+Notification retention.
+
+Read notifications are deleted ``NOTIFICATION_READ_RETENTION_DAYS`` after
+their last activity and unread ones after ``NOTIFICATION_RETENTION_DAYS``.
+
+Notifications are not range partitioned like chat messages: coalescing
+relies on a unique constraint over unread rows that cannot include
+``created_at``, which PostgreSQL would require of a partitioned table. They
+are expired with batched DELETEs on the ``(recipient, -created_at, -id)``
+index instead, which coalescing keeps small.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.partitions import delete_in_batches
+from . import unread
+from .models import Notification
+
+
+def expire_notifications():
+    now = timezone.now()
+    batch_size = settings.RETENTION_DELETE_BATCH_SIZE
+    read = delete_in_batches(
+        Notification.objects.filter(
+            is_read=True,
+            created_at__lt=now - datetime.timedelta(days=settings.NOTIFICATION_READ_RETENTION_DAYS)
+        ).order_by(),
+        batch_size
+    )
+
+    expired = Notification.objects.filter(
+        created_at__lt=now - datetime.timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    ).order_by()
+    # Unread ones still count towards badges
+    recipients = set(
+        expired.filter(is_read=False).values_list('recipient_id', flat=True).distinct()
+    )
+    deleted = delete_in_batches(expired, batch_size)
+    unread.invalidate(recipients)
+    return read + deleted
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import realtime, unread
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, raw=False, **kwargs):
+    # bulk_create skips this signal; apps.notifications.fanout publishes itself
+    if created and not raw:
+        unread.notifications_created([instance])
+        realtime.publish([instance])
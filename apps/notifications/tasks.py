@@ -0,0 +1,19 @@
+from apps.chat.models import ChatRoom
+from apps.users.models import User
+from config.celery import app
+from . import retention
+from .fanout import fan_out_chat_message
+
+
+@app.task(ignore_result=True)
+def fan_out_chat_message_notifications(room_id, sender_id):
+    room = ChatRoom.objects.filter(id=room_id).first()
+    sender = User.objects.filter(id=sender_id).first()
+    if room is None or sender is None:
+        return 0
+    return fan_out_chat_message(room, sender)
+
+
+@app.task(ignore_result=True)
+def expire_notifications():
+    return retention.expire_notifications()
@@ -0,0 +1,173 @@
+"""
+Maintained unread counters for badges.
+
+Each user has one Redis hash holding their unread notification count and one
+field per chat room, so a page load reads every badge with a single
+``HGETALL`` instead of running ``COUNT(*)`` queries:
+
+* notifications are incremented when they are created and decremented by
+  ``Notification.mark_as_read``; ``mark_all_as_read`` resets them.
+* room counts are incremented for every other participant who does not
+  have the room open (see ``apps.chat.viewers``) by the chat consumer as it
+  sends a message, so the increment always lands before the recipient can
+  open the room; they are reset or recomputed when
+  ``ChatParticipant.update_last_read`` advances the read watermark, on
+  connect and disconnect.
+
+A hash is only trusted once it has been rebuilt from the database (it carries
+a ``ready`` field); increments on a missing hash are dropped, and reads of a
+missing hash rebuild it. Hashes expire after ``UNREAD_COUNTER_TTL`` seconds,
+which also bounds any drift.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.chat.models import ChatParticipant, Message
+from config.redis_client import get_redis
+from .models import Notification
+
+UNREAD_KEY = 'unread:{}'
+NOTIFICATIONS_FIELD = 'notifications'
+ROOM_FIELD = 'room:{}'
+
+# HINCRBY only on hashes that were rebuilt, never below zero
+INCR_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'ready') == 0 then
+    return nil
+end
+local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if value < 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], 0)
+    return 0
+end
+return value
+"""
+
+_incr_script = None
+
+
+def _incr(pipe, user_id, field, delta):
+    global _incr_script
+    if _incr_script is None:
+        _incr_script = get_redis().register_script(INCR_SCRIPT)
+    _incr_script(keys=[UNREAD_KEY.format(user_id)], args=[field, delta], client=pipe)
+
+
+def rebuild(user_id):
+    """Recount a user's unread notifications and rooms from the database."""
+    notifications = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    unread_in_room = (
+        Message.objects.filter(
+            room_id=OuterRef('room_id'),
+            id__gt=OuterRef('last_read_message_id')
+        )
+        .exclude(sender_id=user_id)
+        .order_by()
+        .values('room_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    rooms = ChatParticipant.objects.filter(user_id=user_id).annotate(
+        unread=Coalesce(Subquery(unread_in_room), 0, output_field=IntegerField())
+    ).values_list('room_id', 'unread')
+
+    mapping = {'ready': 1, NOTIFICATIONS_FIELD: notifications}
+    mapping.update({ROOM_FIELD.format(room_id): unread for room_id, unread in rooms})
+    key = UNREAD_KEY.format(user_id)
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, settings.UNREAD_COUNTER_TTL)
+    pipe.execute()
+    return mapping
+
+
+def get_unread(user_id):
+    """``{'notifications': n, 'rooms': {room_id: n}}`` for one user."""
+    raw = {
+        field.decode(): int(value)
+        for field, value in get_redis().hgetall(UNREAD_KEY.format(user_id)).items()
+    }
+    if 'ready' not in raw:
+        raw = rebuild(user_id)
+    return {
+        'notifications': raw.get(NOTIFICATIONS_FIELD, 0),
+        'rooms': {
+            int(field.split(':', 1)[1]): value
+            for field, value in raw.items()
+            if field.startswith('room:')
+        },
+    }
+
+
+def invalidate(user_ids):
+    """Drop the users' hashes so they are rebuilt on their next read."""
+    keys = [UNREAD_KEY.format(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: get_redis().delete(*keys))
+
+
+def notification_counts(user_ids):
+    """``{user_id: unread notifications}``, rebuilding any missing hashes."""
+    user_ids = list(user_ids)
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hmget(UNREAD_KEY.format(user_id), 'ready', NOTIFICATIONS_FIELD)
+    counts = {}
+    for user_id, (ready, value) in zip(user_ids, pipe.execute()):
+        if ready is None:
+            counts[user_id] = rebuild(user_id)[NOTIFICATIONS_FIELD]
+        else:
+            counts[user_id] = int(value or 0)
+    return counts
+
+
+def notifications_created(notifications):
+    deltas = {}
+    for notification in notifications:
+        if not notification.is_read:
+            deltas[notification.recipient_id] = deltas.get(notification.recipient_id, 0) + 1
+    if not deltas:
+        return
+
+    def apply():
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id, delta in deltas.items():
+            _incr(pipe, user_id, NOTIFICATIONS_FIELD, delta)
+        pipe.execute()
+    transaction.on_commit(apply)
+
+
+def notification_read(user_id, count=1):
+    def apply():
+        pipe = get_redis().pipeline(transaction=False)
+        _incr(pipe, user_id, NOTIFICATIONS_FIELD, -count)
+        pipe.execute()
+    transaction.on_commit(apply)
+
+
+def notifications_cleared(user_id):
+    def apply():
+        key = UNREAD_KEY.format(user_id)
+        if get_redis().hexists(key, 'ready'):
+            get_redis().hset(key, NOTIFICATIONS_FIELD, 0)
+    transaction.on_commit(apply)
+
+
+def messages_sent(room_id, user_ids, count=1):
+    def apply():
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            _incr(pipe, user_id, ROOM_FIELD.format(room_id), count)
+        pipe.execute()
+    transaction.on_commit(apply)
+
+
+def room_read(user_id, room_id, unread=0):
+    def apply():
+        key = UNREAD_KEY.format(user_id)
+        if get_redis().hexists(key, 'ready'):
+            get_redis().hset(key, ROOM_FIELD.format(room_id), unread)
+    transaction.on_commit(apply)
@@ -0,0 +1,169 @@
+"""
+Materialized home-feed timelines.
+
+Every user's home feed is a capped Redis sorted set of post ids (scored by
+id, which increases with publication order). Publishing a post pushes its id
+into the timeline of every follower of the author and every member of the
+community (fan-out-on-write), in a Celery task.
+
+Authors with more than ``FEED_FANOUT_MAX_FOLLOWERS`` followers and
+communities with more than ``FEED_FANOUT_MAX_MEMBERS`` members are not fanned
+out. Their posts are only added to the author's or community's own timeline
+and are pulled in at read time (hybrid fan-out), so one post never costs
+millions of writes.
+
+Reads merge the user's timeline with the pulled sources and page through
+them with a ``before`` cursor (the last post id seen). A missing timeline is
+rebuilt from the database on first read; following or unfollowing, joining or
+leaving simply drops the user's timeline so it is rebuilt.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from config.redis_client import get_redis
+from .models import Post
+
+USER_TIMELINE_KEY = 'feed:user:{}'
+AUTHOR_TIMELINE_KEY = 'feed:author:{}'
+COMMUNITY_TIMELINE_KEY = 'feed:community:{}'
+PULL_AUTHORS_KEY = 'feed:pull:authors'
+PULL_COMMUNITIES_KEY = 'feed:pull:communities'
+
+
+def _push(pipe, key, post_id):
+    pipe.zadd(key, {post_id: post_id})
+    pipe.zremrangebyrank(key, 0, -settings.FEED_TIMELINE_LENGTH - 1)
+
+
+def fan_out_post(post):
+    """Push a newly published post into its readers' timelines."""
+    client = get_redis()
+    pipe = client.pipeline(transaction=False)
+    _push(pipe, AUTHOR_TIMELINE_KEY.format(post.author_id), post.id)
+    _push(pipe, COMMUNITY_TIMELINE_KEY.format(post.community_id), post.id)
+
+    followers = post.author.followers.values_list('id', flat=True)
+    if followers.count() > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        pipe.sadd(PULL_AUTHORS_KEY, post.author_id)
+        followers = []
+    else:
+        pipe.srem(PULL_AUTHORS_KEY, post.author_id)
+
+    members = post.community.members.values_list('id', flat=True)
+    if members.count() > settings.FEED_FANOUT_MAX_MEMBERS:
+        pipe.sadd(PULL_COMMUNITIES_KEY, post.community_id)
+        members = []
+    else:
+        pipe.srem(PULL_COMMUNITIES_KEY, post.community_id)
+    pipe.execute()
+
+    recipients = list(set(followers) | set(members) | {post.author_id})
+    pushed = 0
+    for start in range(0, len(recipients), 1000):
+        keys = [USER_TIMELINE_KEY.format(pk) for pk in recipients[start:start + 1000]]
+        for key in keys:
+            pipe.exists(key)
+        # Only extend timelines that exist; missing ones are rebuilt on read
+        existing = [key for key, exists in zip(keys, pipe.execute()) if exists]
+        for key in existing:
+            _push(pipe, key, post.id)
+        pipe.execute()
+        pushed += len(existing)
+    return pushed
+
+
+def remove_post(post):
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zrem(AUTHOR_TIMELINE_KEY.format(post.author_id), post.id)
+    pipe.zrem(COMMUNITY_TIMELINE_KEY.format(post.community_id), post.id)
+    pipe.execute()
+
+
+def invalidate_timeline(user_id):
+    get_redis().delete(USER_TIMELINE_KEY.format(user_id))
+
+
+def feed_queryset(user):
+    """The naive home feed: posts by followed authors or in joined communities."""
+    return Post.objects.filter(
+        Q(author__in=user.following.all())
+        | Q(community__in=user.joined_communities.all())
+        | Q(author=user),
+        is_published=True,
+        is_approved=True
+    )
+
+
+def rebuild_timeline(user):
+    client = get_redis()
+    key = USER_TIMELINE_KEY.format(user.id)
+    post_ids = list(
+        feed_queryset(user)
+        .order_by('-id')
+        .values_list('id', flat=True)[:settings.FEED_TIMELINE_LENGTH]
+    )
+    pipe = client.pipeline()
+    pipe.delete(key)
+    if post_ids:
+        pipe.zadd(key, {post_id: post_id for post_id in post_ids})
+    else:
+        # Placeholder so an empty feed is not rebuilt on every read
+        pipe.zadd(key, {0: 0})
+    pipe.execute()
+
+
+def _pull_sources(user):
+    client = get_redis()
+    keys = []
+    pull_authors = [int(pk) for pk in client.smembers(PULL_AUTHORS_KEY)]
+    if pull_authors:
+        keys += [
+            AUTHOR_TIMELINE_KEY.format(pk)
+            for pk in user.following.filter(id__in=pull_authors).values_list('id', flat=True)
+        ]
+    pull_communities = [int(pk) for pk in client.smembers(PULL_COMMUNITIES_KEY)]
+    if pull_communities:
+        keys += [
+            COMMUNITY_TIMELINE_KEY.format(pk)
+            for pk in user.joined_communities.filter(id__in=pull_communities).values_list('id', flat=True)
+        ]
+    return keys
+
+
+def get_feed_ids(user, before=None, limit=20):
+    """
+    Return ``(post_ids, next_cursor)`` for the user's home feed, newest first.
+    Pass ``next_cursor`` back as ``before`` to get the next page.
+    """
+    client = get_redis()
+    key = USER_TIMELINE_KEY.format(user.id)
+    if not client.exists(key):
+        rebuild_timeline(user)
+
+    max_score = f'({before}' if before is not None else '+inf'
+    keys = [key] + _pull_sources(user)
+    pipe = client.pipeline(transaction=False)
+    for source in keys:
+        # Exclude the 0 placeholder of empty timelines
+        pipe.zrevrangebyscore(source, max_score, '(0', start=0, num=limit)
+    pages = [[int(post_id) for post_id in page] for page in pipe.execute()]
+
+    post_ids = []
+    for post_id in heapq.merge(*pages, reverse=True):
+        if not post_ids or post_ids[-1] != post_id:
+            post_ids.append(post_id)
+        if len(post_ids) == limit:
+            break
+    next_cursor = post_ids[-1] if len(post_ids) == limit else None
+    return post_ids, next_cursor
+
+
+def get_feed(user, before=None, limit=20):
+    """Like ``get_feed_ids`` but returns the ``Post`` objects."""
+    post_ids, next_cursor = get_feed_ids(user, before, limit)
+    posts = Post.objects.filter(
+        id__in=post_ids, is_published=True, is_approved=True
+    ).select_related('author', 'community').in_bulk()
+    return [posts[post_id] for post_id in post_ids if post_id in posts], next_cursor
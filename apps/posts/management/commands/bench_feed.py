@@ -0,0 +1,120 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.communities.models import Community
+from apps.posts import feeds
+from apps.posts.models import Post
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the naive home-feed query with materialized timelines on '
+        'synthetic data. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--communities', type=int, default=200)
+        parser.add_argument('--follows', type=int, default=50)
+        parser.add_argument('--joins', type=int, default=5)
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--skip-generate', action='store_true')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        if not options['skip_generate']:
+            self.generate(options)
+
+        user_ids = list(User.objects.filter(username__startswith='feedbench').values_list('id', flat=True))
+        sample = random.sample(user_ids, min(options['samples'], len(user_ids)))
+        users = list(User.objects.filter(id__in=sample))
+        limit = options['page_size']
+
+        def naive(user):
+            return list(feeds.feed_queryset(user).order_by('-created_at')[:limit])
+
+        def rebuild(user):
+            feeds.invalidate_timeline(user.id)
+            feeds.rebuild_timeline(user)
+
+        def timeline(user):
+            return feeds.get_feed(user, limit=limit)
+
+        def timeline_deep(user):
+            cursor = None
+            for _ in range(10):
+                posts, cursor = feeds.get_feed(user, before=cursor, limit=limit)
+                if cursor is None:
+                    break
+            return posts
+
+        for label, fn in (
+            ('naive query', naive),
+            ('timeline rebuild', rebuild),
+            ('timeline read', timeline),
+            ('timeline page 10', timeline_deep),
+        ):
+            timings = []
+            for user in users:
+                started = time.perf_counter()
+                fn(user)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{label:>17}: median {statistics.median(timings):8.2f} ms, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms'
+            )
+
+    def generate(self, options):
+        self.stdout.write('Generating synthetic data...')
+        users = User.objects.bulk_create([
+            User(username=f'feedbench{i}', email=f'feedbench{i}@example.com', password='!')
+            for i in range(options['users'])
+        ], batch_size=5000)
+        if connection.vendor != 'postgresql':
+            users = list(User.objects.filter(username__startswith='feedbench'))
+        user_ids = [user.id for user in users]
+
+        communities = Community.objects.bulk_create([
+            Community(name=f'Feed bench {i}', slug=f'feed-bench-{i}', description='', creator_id=user_ids[0])
+            for i in range(options['communities'])
+        ])
+        if connection.vendor != 'postgresql':
+            communities = list(Community.objects.filter(slug__startswith='feed-bench-'))
+        community_ids = [community.id for community in communities]
+
+        Follow = User.followers.through
+        Follow.objects.bulk_create([
+            Follow(from_user_id=author_id, to_user_id=user_id)
+            for user_id in user_ids
+            for author_id in random.sample(user_ids, options['follows'])
+            if author_id != user_id
+        ], batch_size=10000, ignore_conflicts=True)
+
+        Member = Community.members.through
+        Member.objects.bulk_create([
+            Member(community_id=community_id, user_id=user_id)
+            for user_id in user_ids
+            for community_id in random.sample(community_ids, options['joins'])
+        ], batch_size=10000, ignore_conflicts=True)
+
+        batch = 10000
+        for start in range(0, options['posts'], batch):
+            Post.objects.bulk_create([
+                Post(
+                    title=f'Post {i}',
+                    content='Lorem ipsum',
+                    author_id=random.choice(user_ids),
+                    community_id=random.choice(community_ids),
+                )
+                for i in range(start, min(start + batch, options['posts']))
+            ])
+        self.stdout.write('Done.')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from apps.posts.models import Comment, Post, comment_path_segment
+
+
+class Command(BaseCommand):
+    help = 'Recompute Comment.path and Comment.depth from the parent links'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        post_ids = options['post_ids'] or (
+            Post.objects.filter(comments__isnull=False)
+            .distinct().order_by('pk').values_list('pk', flat=True)
+        )
+
+        total = 0
+        for post_id in post_ids:
+            comments = list(
+                Comment.objects.filter(post_id=post_id)
+                .order_by('pk').only('pk', 'parent_id', 'path', 'depth')
+            )
+            by_pk = {comment.pk: comment for comment in comments}
+            resolved = {}
+
+            def resolve(comment):
+                if comment.pk not in resolved:
+                    parent = by_pk.get(comment.parent_id)
+                    if parent is None:
+                        resolved[comment.pk] = (comment_path_segment(comment.pk), 0)
+                    else:
+                        parent_path, parent_depth = resolve(parent)
+                        resolved[comment.pk] = (
+                            parent_path + comment_path_segment(comment.pk),
+                            parent_depth + 1,
+                        )
+                return resolved[comment.pk]
+
+            changed = []
+            for comment in comments:
+                path, depth = resolve(comment)
+                if (comment.path, comment.depth) != (path, depth):
+                    comment.path, comment.depth = path, depth
+                    changed.append(comment)
+            Comment.objects.bulk_update(changed, ['path', 'depth'], batch_size=1000)
+            total += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {total} comment paths'))
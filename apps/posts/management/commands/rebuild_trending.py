@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scores from the database and replace the trending sets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.TRENDING_BACKFILL_DAYS,
+            help='Only score posts published in the last this many days'
+        )
+
+    def handle(self, *args, **options):
+        ranked = trending.rebuild(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Ranked {ranked} posts'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from apps.posts.models import Post, PostRating
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the incremental rating stats on Post from PostRating rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk').only('pk', *Post.RATING_STATS_FIELDS)
+        if options['post_ids']:
+            posts = posts.filter(pk__in=options['post_ids'])
+
+        batch_size = options['batch_size']
+        last_pk = 0
+        fixed = checked = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            stats = {
+                row['post']: row
+                for row in PostRating.objects.filter(post__in=batch)
+                .values('post')
+                .annotate(**PostRating.stats_aggregates())
+                .order_by()
+            }
+            empty = dict.fromkeys(PostRating.stats_aggregates(), 0)
+
+            drifted = []
+            for post in batch:
+                before = [getattr(post, field) for field in Post.RATING_STATS_FIELDS]
+                post.set_rating_stats(stats.get(post.pk, empty))
+                if before != [getattr(post, field) for field in Post.RATING_STATS_FIELDS]:
+                    drifted.append(post)
+            Post.objects.bulk_update(drifted, Post.RATING_STATS_FIELDS)
+            checked += len(batch)
+            fixed += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} posts, corrected {fixed}'
+        ))
@@ -1,7 +1,13 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from apps.users.models import User
 from apps.communities.models import Community
+from apps.core.counters import register_counter, register_fk_counter
 
 class Post(models.Model):
     title = models.CharField(_('title'), max_length=200)
@@ -27,24 +33,84 @@ class Post(models.Model):
     view_count = models.IntegerField(default=0)
     average_rating = models.FloatField(default=0)
     total_ratings = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    
+    RATING_STATS_FIELDS = [
+        'average_rating', 'total_ratings', 'rating_sum',
+        'rating_1_count', 'rating_2_count', 'rating_3_count',
+        'rating_4_count', 'rating_5_count',
+    ]
     
     class Meta:
         verbose_name = _('post')
         verbose_name_plural = _('posts')
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (apps.core.pagination)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['community', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return self.title
     
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+    
+    @classmethod
+    def apply_rating_change(cls, post_id, old_rating=None, new_rating=None):
+        """
+        Atomically fold one rating being added, changed or removed into the
+        post's running stats. ``old_rating`` is None for a new rating and
+        ``new_rating`` is None for a deleted one.
+        """
+        count_delta = (new_rating is not None) - (old_rating is not None)
+        sum_delta = (new_rating or 0) - (old_rating or 0)
+        updates = {
+            'rating_sum': F('rating_sum') + sum_delta,
+            'total_ratings': F('total_ratings') + count_delta,
+            # SET expressions see the row as it was before the UPDATE
+            'average_rating': Case(
+                When(
+                    total_ratings__gt=-count_delta,
+                    then=Cast(F('rating_sum') + sum_delta, FloatField())
+                    / (F('total_ratings') + count_delta)
+                ),
+                default=Value(0.0),
+                output_field=FloatField()
+            ),
+        }
+        if old_rating is not None:
+            field = f'rating_{old_rating}_count'
+            updates[field] = F(field) - 1
+        if new_rating is not None:
+            field = f'rating_{new_rating}_count'
+            updates[field] = F(field) + 1 if field not in updates else F(field)
+        return cls.objects.filter(pk=post_id).update(**updates)
+    
     def update_rating_stats(self):
-        ratings = self.ratings.all()
-        if ratings.exists():
-            self.average_rating = sum(r.rating for r in ratings) / ratings.count()
-            self.total_ratings = ratings.count()
+        """Recompute the rating stats from scratch (see reconcile_rating_stats)."""
+        stats = self.ratings.aggregate(**PostRating.stats_aggregates())
+        self.set_rating_stats(stats)
+        self.save(update_fields=self.RATING_STATS_FIELDS)
+    
+    def set_rating_stats(self, stats):
+        self.total_ratings = stats['total_ratings'] or 0
+        self.rating_sum = stats['rating_sum'] or 0
+        for star in range(1, 6):
+            field = f'rating_{star}_count'
+            setattr(self, field, stats[field] or 0)
+        if self.total_ratings:
+            self.average_rating = self.rating_sum / self.total_ratings
         else:
             self.average_rating = 0
-            self.total_ratings = 0
-        self.save()
 
 class PostRating(models.Model):
     RATING_CHOICES = [
@@ -77,9 +143,103 @@ class PostRating(models.Model):
     def __str__(self):
         return f"{self.user} rated {self.post} {self.rating} stars"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
+    
+    @staticmethod
+    def stats_aggregates():
+        aggregates = {
+            'total_ratings': Count('id'),
+            'rating_sum': Sum('rating'),
+        }
+        for star in range(1, 6):
+            aggregates[f'rating_{star}_count'] = Count('id', filter=Q(rating=star))
+        return aggregates
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.post.update_rating_stats()
+        adding = self._state.adding
+        old_rating = None if adding else getattr(self, '_stored_rating', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Post.apply_rating_change(self.post_id, new_rating=self.rating)
+            elif old_rating is None:
+                # Loaded without the rating column; fall back to a rebuild
+                self.post.update_rating_stats()
+            elif old_rating != self.rating:
+                Post.apply_rating_change(self.post_id, old_rating, self.rating)
+        self._stored_rating = self.rating
+
+
+@receiver(post_delete, sender=PostRating)
+def remove_rating_from_stats(sender, instance, **kwargs):
+    Post.apply_rating_change(instance.post_id, old_rating=instance.rating)
+
+COMMENT_PATH_SEGMENT = 10
+# Comment.path holds one segment per level
+COMMENT_MAX_DEPTH = 1000 // COMMENT_PATH_SEGMENT - 1
+
+
+def comment_path_segment(pk):
+    return str(pk).zfill(COMMENT_PATH_SEGMENT)
+
+
+def comment_path_successor(path):
+    """The smallest path that sorts after ``path`` and all its descendants."""
+    head, last = path[:-COMMENT_PATH_SEGMENT], path[-COMMENT_PATH_SEGMENT:]
+    return head + comment_path_segment(int(last) + 1)
+
+
+class CommentQuerySet(models.QuerySet):
+    """
+    Thread queries over the materialized ``path``. Paths are fixed-width
+    digit segments, so ordering by path yields depth-first thread order and a
+    subtree is a single range scan on the (post, path) index.
+    """
+    
+    def thread(self, post):
+        return self.filter(post=post).order_by('path')
+    
+    def subtree(self, comment, include_self=True):
+        lower = {'path__gte' if include_self else 'path__gt': comment.path}
+        return self.filter(
+            post_id=comment.post_id,
+            path__lt=comment_path_successor(comment.path),
+            **lower
+        ).order_by('path')
+    
+    def _page(self, roots, after, limit, max_depth):
+        if after:
+            roots = roots.filter(path__gt=after)
+        roots = list(roots.order_by('path').values_list('path', flat=True)[:limit])
+        if not roots:
+            return [], None
+        comments = self.filter(
+            path__gte=roots[0],
+            path__lt=comment_path_successor(roots[-1])
+        )
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=max_depth)
+        next_cursor = roots[-1] if len(roots) == limit else None
+        return list(comments.order_by('path')), next_cursor
+    
+    def thread_page(self, post, after=None, limit=20, max_depth=None):
+        """
+        A page of ``limit`` top-level comments with their replies, in thread
+        order, and the cursor for the next page.
+        """
+        base = self.filter(post=post)
+        return base._page(base.filter(depth=0), after, limit, max_depth)
+    
+    def replies_page(self, parent, after=None, limit=20, max_depth=None):
+        """Load more replies under ``parent``: its next ``limit`` children with their subtrees."""
+        base = self.subtree(parent, include_self=False)
+        if max_depth is not None:
+            max_depth += parent.depth
+        return base._page(base.filter(depth=parent.depth + 1), after, limit, max_depth)
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -102,14 +262,64 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='replies'
     )
+    # Materialized path: the zero-padded ids of every ancestor and then this
+    # comment, e.g. '00000000120000000345'. Set on insert.
+    path = models.CharField(max_length=1000, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    objects = CommentQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('comment')
         verbose_name_plural = _('comments')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'path']),
+            models.Index(fields=['post', 'depth', 'path']),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author} on {self.post}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        
+        if self.parent_id:
+            parent = self.parent
+            if parent.post_id != self.post_id:
+                raise ValueError('A reply must belong to the same post as its parent.')
+            if parent.depth >= COMMENT_MAX_DEPTH:
+                raise ValueError(
+                    f'Replies cannot be nested more than {COMMENT_MAX_DEPTH} levels deep.'
+                )
+        # set_comment_path fills in the path in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Comment)
+def set_comment_path(sender, instance, created, raw=False, **kwargs):
+    """
+    The path ends with the comment's own id, so it is written right after
+    the INSERT. Connected when the model is imported, this runs before any
+    other post_save receiver, which therefore sees the final path and depth.
+    """
+    if not created or raw:
+        return
+    if instance.parent_id:
+        parent = instance.parent
+        instance.path = parent.path + comment_path_segment(instance.pk)
+        instance.depth = parent.depth + 1
+    else:
+        instance.path = comment_path_segment(instance.pk)
+        instance.depth = 0
+    Comment.objects.filter(pk=instance.pk).update(path=instance.path, depth=instance.depth)
+
+register_fk_counter(Community, 'post_count', Post, 'community')
+register_fk_counter(Post, 'comment_count', Comment, 'post')
+# Fed by apps.posts.view_counts.record_view
+register_counter(Post, 'view_count', buffered=settings.POST_VIEW_COUNT_BACKEND == 'redis')
 
 class PostMedia(models.Model):
     MEDIA_TYPES = [
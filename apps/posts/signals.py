@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.communities.models import Community
+from apps.users import leaderboards
+from apps.users.models import User
+from . import feeds, trending
+from .models import Comment, Post, PostRating
+from .tasks import fan_out_post
+
+
+@receiver(post_save, sender=Post)
+def publish_to_feeds(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.is_published and instance.is_approved:
+        transaction.on_commit(lambda: fan_out_post.delay(instance.id))
+        trending.post_published(instance)
+        leaderboards.award(instance.author_id, 'post', community_id=instance.community_id)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_feeds(sender, instance, **kwargs):
+    transaction.on_commit(lambda: feeds.remove_post(instance))
+    transaction.on_commit(lambda: trending.remove_post(instance.id, instance.community_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_trending(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance.post_id, 'comment')
+        post = instance.post
+        if post.is_published and post.is_approved:
+            leaderboards.award(instance.author_id, 'comment', community_id=post.community_id)
+
+
+@receiver(post_save, sender=PostRating)
+def rating_trending(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance.post_id, 'rating', weight=instance.rating)
+        post = instance.post
+        if post.is_published and post.is_approved:
+            leaderboards.award(
+                post.author_id, 'rating', instance.rating, community_id=post.community_id
+            )
+
+
+def _invalidate_feeds(instance, action, reverse, pk_set, related):
+    # Forward changes (author.followers.add(user), community.members.add(user))
+    # affect the users in pk_set; reverse ones affect ``instance`` itself.
+    if reverse:
+        user_ids = [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else ()
+    elif action in ('post_add', 'post_remove'):
+        user_ids = pk_set or ()
+    elif action == 'pre_clear':
+        user_ids = related.values_list('id', flat=True)
+    else:
+        return
+    for user_id in user_ids:
+        feeds.invalidate_timeline(user_id)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    related = None if reverse else instance.followers.all()
+    _invalidate_feeds(instance, action, reverse, pk_set, related)
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def memberships_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    related = None if reverse else instance.members.all()
+    _invalidate_feeds(instance, action, reverse, pk_set, related)
@@ -0,0 +1,11 @@
+from config.celery import app
+from . import feeds
+from .models import Post
+
+
+@app.task(ignore_result=True)
+def fan_out_post(post_id):
+    post = Post.objects.filter(id=post_id).select_related('author', 'community').first()
+    if post is None:
+        return 0
+    return feeds.fan_out_post(post)
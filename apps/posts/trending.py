@@ -0,0 +1,179 @@
+"""
+Trending ("hot") posts.
+
+A post's hot score is its engagement with exponential time decay:
+``sum(weight * 2 ** ((t - EPOCH) / TRENDING_HALF_LIFE))`` over its events
+(being published, views, comments, ratings), stored as a base-2 logarithm.
+All scores decay at the same rate, so their order at any moment is the
+order of this sum. Scores therefore never need rescoring as time passes. A
+new event is folded in with one log-add-exp, ``log2(2 ** old + 2 ** new)``,
+in a Lua script. It updates the global sorted set and the post's community
+set atomically, in O(log n).
+
+The global set is capped at ``TRENDING_MAX_POSTS``. Posts that fall off the
+end are dropped from their community set too, and stop collecting events.
+Only posts that were added when published (or by the backfill) are tracked;
+``rebuild_trending`` recomputes everything from the database.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config.redis_client import get_redis
+from .models import Comment, Post, PostRating
+
+GLOBAL_KEY = 'trending:global'
+COMMUNITY_KEY_PREFIX = 'trending:community:'
+POST_COMMUNITY_KEY = 'trending:post_community'
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+RECORD_SCRIPT = """
+local community = ARGV[5]
+if community == '' then
+    community = redis.call('HGET', KEYS[2], ARGV[1])
+    if not community then
+        return 0
+    end
+else
+    redis.call('HSET', KEYS[2], ARGV[1], community)
+end
+local function add(key)
+    local score = tonumber(ARGV[2])
+    local old = redis.call('ZSCORE', key, ARGV[1])
+    if old then
+        old = tonumber(old)
+        local high, low = math.max(old, score), math.min(old, score)
+        score = high + math.log(1 + 2 ^ (low - high)) / math.log(2)
+    end
+    redis.call('ZADD', key, score, ARGV[1])
+end
+add(KEYS[1])
+add(ARGV[4] .. community)
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[3])
+if excess > 0 then
+    for _, post in ipairs(redis.call('ZRANGE', KEYS[1], 0, excess - 1)) do
+        local owner = redis.call('HGET', KEYS[2], post)
+        if owner then
+            redis.call('ZREM', ARGV[4] .. owner, post)
+        end
+        redis.call('HDEL', KEYS[2], post)
+    end
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+end
+return 1
+"""
+
+_record_script = None
+
+
+def community_key(community_id):
+    return f'{COMMUNITY_KEY_PREFIX}{community_id}'
+
+
+def event_score(weight, at=None):
+    """log2 of one event's decayed weight."""
+    at = at or timezone.now()
+    return math.log2(weight) + (at - EPOCH).total_seconds() / settings.TRENDING_HALF_LIFE
+
+
+def _record(post_id, score, community_id=None):
+    global _record_script
+    if _record_script is None:
+        _record_script = get_redis().register_script(RECORD_SCRIPT)
+    _record_script(
+        keys=[GLOBAL_KEY, POST_COMMUNITY_KEY],
+        args=[post_id, score, settings.TRENDING_MAX_POSTS, COMMUNITY_KEY_PREFIX,
+              community_id if community_id is not None else '']
+    )
+
+
+def record(post_id, event, weight=1, community_id=None):
+    """Fold an engagement ``event`` on a post into its hot score, after commit."""
+    score = event_score(settings.TRENDING_WEIGHTS[event] * weight)
+    transaction.on_commit(lambda: _record(post_id, score, community_id))
+
+
+def post_published(post):
+    record(post.id, 'post', community_id=post.community_id)
+
+
+def remove_post(post_id, community_id):
+    pipe = get_redis().pipeline()
+    pipe.zrem(GLOBAL_KEY, post_id)
+    pipe.zrem(community_key(community_id), post_id)
+    pipe.hdel(POST_COMMUNITY_KEY, post_id)
+    pipe.execute()
+
+
+def trending_post_ids(community_id=None, offset=0, limit=20):
+    key = GLOBAL_KEY if community_id is None else community_key(community_id)
+    return [int(post_id) for post_id in get_redis().zrevrange(key, offset, offset + limit - 1)]
+
+
+def trending_posts(community_id=None, offset=0, limit=20):
+    post_ids = trending_post_ids(community_id, offset, limit)
+    posts = Post.objects.filter(
+        id__in=post_ids, is_published=True, is_approved=True
+    ).select_related('author', 'community').in_bulk()
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def _log2_sum(exponents):
+    high = max(exponents)
+    return high + math.log2(sum(2 ** (exponent - high) for exponent in exponents))
+
+
+def rebuild(days=None):
+    """
+    Recompute the hot scores of posts published in the last ``days`` days
+    from the database and replace the trending sets. View timestamps are not
+    stored, so views are counted as of the post's publication.
+    """
+    days = days or settings.TRENDING_BACKFILL_DAYS
+    weights = settings.TRENDING_WEIGHTS
+    since = timezone.now() - timedelta(days=days)
+    posts = Post.objects.filter(created_at__gte=since, is_published=True, is_approved=True)
+
+    exponents, communities = {}, {}
+    for post_id, community_id, created_at, views in posts.values_list(
+        'id', 'community_id', 'created_at', 'view_count'
+    ).iterator():
+        communities[post_id] = community_id
+        exponents[post_id] = [event_score(weights['post'], created_at)]
+        if views:
+            exponents[post_id].append(event_score(weights['view'] * views, created_at))
+    for post_id, created_at in Comment.objects.filter(
+        post_id__in=posts.values('id')
+    ).values_list('post_id', 'created_at').iterator():
+        if post_id in exponents:
+            exponents[post_id].append(event_score(weights['comment'], created_at))
+    for post_id, stars, created_at in PostRating.objects.filter(
+        post_id__in=posts.values('id')
+    ).values_list('post_id', 'rating', 'created_at').iterator():
+        if post_id in exponents:
+            exponents[post_id].append(event_score(weights['rating'] * stars, created_at))
+
+    scores = sorted(
+        ((_log2_sum(values), post_id) for post_id, values in exponents.items()),
+        reverse=True
+    )[:settings.TRENDING_MAX_POSTS]
+
+    client = get_redis()
+    stale = [GLOBAL_KEY, POST_COMMUNITY_KEY] + list(
+        client.scan_iter(match=f'{COMMUNITY_KEY_PREFIX}*', count=1000)
+    )
+    pipe = client.pipeline()
+    pipe.delete(*stale)
+    for start in range(0, len(scores), 1000):
+        chunk = scores[start:start + 1000]
+        pipe.zadd(GLOBAL_KEY, {post_id: score for score, post_id in chunk})
+        pipe.hset(POST_COMMUNITY_KEY, mapping={
+            post_id: communities[post_id] for _, post_id in chunk
+        })
+        for score, post_id in chunk:
+            pipe.zadd(community_key(communities[post_id]), {post_id: score})
+    pipe.execute()
+    return len(scores)
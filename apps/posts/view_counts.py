@@ -0,0 +1,152 @@
+"""
+Buffered view counting for ``Post.view_count``.
+
+``record_view`` never touches the post row. Increments are collected by the
+backend selected with ``POST_VIEW_COUNT_BACKEND`` and written as aggregated
+deltas, one UPDATE per distinct delta:
+
+``'redis'``
+    Increments go to the ``Post.view_count`` counter-cache hash and are
+    written by the ``flush_counter_caches`` beat task. Shared by all workers.
+
+``'memory'``
+    Increments are kept per process and written once
+    ``POST_VIEW_FLUSH_THRESHOLD`` views are pending or
+    ``POST_VIEW_FLUSH_INTERVAL`` seconds have passed, by a background
+    thread once traffic stops, and at exit. Unflushed views are lost if the
+    process is killed.
+
+With ``POST_VIEW_DEDUP_WINDOW`` set, repeat views of a post by the same user
+within that many seconds are counted once. ``get_view_count`` and
+``get_view_counts`` add the pending deltas to the stored value.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from apps.core.counters import get_counter
+from config.redis_client import get_redis
+from . import trending
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+view_counter = get_counter(Post, 'view_count')
+
+
+class RedisViewBuffer:
+    def is_first_view(self, post_id, user_id, window):
+        key = f'posts:view_seen:{post_id}:{user_id}'
+        return bool(get_redis().set(key, 1, nx=True, ex=window))
+
+    def incr(self, post_id):
+        view_counter.apply({post_id: 1})
+
+    def pending_many(self, post_ids):
+        return view_counter.pending_many(post_ids)
+
+    def flush(self):
+        return view_counter.flush()
+
+
+class MemoryViewBuffer:
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self.deltas = {}
+        self.seen = {}
+        self.pending_total = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def is_first_view(self, post_id, user_id, window):
+        now = time.monotonic()
+        with self.lock:
+            expires = self.seen.get((post_id, user_id))
+            if expires is not None and expires > now:
+                return False
+            self.seen[(post_id, user_id)] = now + window
+            return True
+
+    def incr(self, post_id):
+        with self.lock:
+            self.deltas[post_id] = self.deltas.get(post_id, 0) + 1
+            self.pending_total += 1
+            due = (
+                self.pending_total >= self.threshold
+                or time.monotonic() - self.last_flush >= self.interval
+            )
+        if due:
+            self.flush()
+
+    def pending_many(self, post_ids):
+        with self.lock:
+            return {post_id: self.deltas.get(post_id, 0) for post_id in post_ids}
+
+    def start(self):
+        """Flush (and prune expired dedup entries) every ``interval`` seconds."""
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Post view count flush failed')
+        threading.Thread(target=run, name='post-view-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def flush(self):
+        with self.lock:
+            deltas, self.deltas = self.deltas, {}
+            self.pending_total = 0
+            self.last_flush = now = time.monotonic()
+            self.seen = {key: expires for key, expires in self.seen.items() if expires > now}
+        if deltas:
+            view_counter.write(deltas)
+        return len(deltas)
+
+
+_buffer = None
+
+
+def get_view_buffer():
+    global _buffer
+    if _buffer is None:
+        if settings.POST_VIEW_COUNT_BACKEND == 'redis':
+            _buffer = RedisViewBuffer()
+        elif settings.POST_VIEW_COUNT_BACKEND == 'memory':
+            _buffer = MemoryViewBuffer(
+                settings.POST_VIEW_FLUSH_THRESHOLD,
+                settings.POST_VIEW_FLUSH_INTERVAL,
+            )
+            _buffer.start()
+        else:
+            raise ValueError(
+                f'Unknown POST_VIEW_COUNT_BACKEND: {settings.POST_VIEW_COUNT_BACKEND!r}'
+            )
+    return _buffer
+
+
+def record_view(post_id, user_id=None):
+    """Count a view of ``post_id``. Returns False if it was deduplicated."""
+    buffer = get_view_buffer()
+    window = settings.POST_VIEW_DEDUP_WINDOW
+    if user_id is not None and window:
+        if not buffer.is_first_view(post_id, user_id, window):
+            return False
+    buffer.incr(post_id)
+    trending.record(post_id, 'view')
+    return True
+
+
+def get_view_counts(posts):
+    """``{post.pk: view_count}`` including views that are not flushed yet."""
+    pending = get_view_buffer().pending_many([post.pk for post in posts])
+    return {post.pk: post.view_count + pending[post.pk] for post in posts}
+
+
+def get_view_count(post):
+    return get_view_counts([post])[post.pk]
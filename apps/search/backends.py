@@ -0,0 +1,133 @@
+"""
+Full-text storage for ``SearchDocument``.
+
+``PostgresSearchBackend``
+    Keeps a weighted ``tsvector`` (title A, body B) in
+    ``SearchDocument.search_vector`` under a GIN index, ranks with
+    ``ts_rank_cd`` and highlights with ``ts_headline``.
+
+``SQLiteSearchBackend``
+    Keeps an FTS5 table whose rowids are ``SearchDocument`` ids, ranks with
+    ``bm25`` and highlights with ``snippet``. For development databases.
+
+Both expose the matching documents as ORM filters and annotations, so
+scoping and pagination are the same queryset code on either database.
+``install`` creates the index structures; the repo has no migrations, so it
+is run by ``manage.py search_reindex --setup``.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector,
+)
+from django.db import connection
+from django.db.models import F, FloatField, TextField
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+
+class PostgresSearchBackend:
+    def vector(self):
+        config = settings.SEARCH_CONFIG
+        return (
+            SearchVector('title', weight='A', config=config)
+            + SearchVector('body', weight='B', config=config)
+        )
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS search_document_vector_gin '
+                f'ON {SearchDocument._meta.db_table} USING gin (search_vector)'
+            )
+
+    def update(self, document_ids):
+        SearchDocument.objects.filter(id__in=document_ids).update(search_vector=self.vector())
+
+    def remove(self, document_ids):
+        pass
+
+    def search(self, queryset, text):
+        query = SearchQuery(text, search_type='websearch', config=settings.SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query, cover_density=True),
+            headline=SearchHeadline(
+                'body', query,
+                config=settings.SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                max_fragments=2,
+            ),
+        )
+
+
+class SQLiteSearchBackend:
+    table = 'search_fts'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                "USING fts5(title, body, tokenize='porter unicode61')"
+            )
+
+    def update(self, document_ids):
+        document_ids = list(document_ids)
+        rows = SearchDocument.objects.filter(id__in=document_ids).values_list('id', 'title', 'body')
+        with connection.cursor() as cursor:
+            self._delete(cursor, document_ids)
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)',
+                list(rows)
+            )
+
+    def remove(self, document_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(document_ids))
+
+    def _delete(self, cursor, document_ids):
+        if document_ids:
+            placeholders = ', '.join(['%s'] * len(document_ids))
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', document_ids
+            )
+
+    def match_expression(self, text):
+        # Every word must appear; quoting stops FTS5 from parsing operators
+        terms = [term.replace('"', '""') for term in text.split()]
+        return ' '.join(f'"{term}"' for term in terms if term)
+
+    def search(self, queryset, text):
+        match = self.match_expression(text)
+        if not match:
+            return queryset.none()
+        document_table = SearchDocument._meta.db_table
+        correlated = f'FROM {self.table} WHERE {self.table} MATCH %s AND rowid = {document_table}.id'
+        # bm25 is lower for better matches
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        ).annotate(
+            rank=RawSQL(f'SELECT -bm25({self.table}, 10.0, 1.0) {correlated}', [match],
+                        output_field=FloatField()),
+            headline=RawSQL(
+                f"SELECT snippet({self.table}, 1, %s, %s, '…', 24) {correlated}",
+                [HIGHLIGHT_START, HIGHLIGHT_STOP, match],
+                output_field=TextField()
+            ),
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = SQLiteSearchBackend()
+    return _backend
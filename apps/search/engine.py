@@ -0,0 +1,69 @@
+"""
+Ranked, highlighted search over posts, comments and chat messages.
+
+Results are limited to what the user can see: posts and comments from public
+communities and from communities they belong to, and messages from chat
+rooms they participate in. Each result is a ``SearchDocument`` annotated
+with ``rank`` and ``headline`` (matched terms wrapped in ``<mark>``), with
+the underlying object attached as ``.object``.
+"""
+from django.db.models import Q
+
+from apps.chat.archive import archived_messages
+from apps.communities.models import Community
+from .backends import get_search_backend
+from .indexing import SOURCES
+from .models import SearchDocument
+
+MAX_LIMIT = 100
+
+
+def visible_documents(user, kinds=None):
+    communities = Community.objects.filter(
+        Q(is_private=False) | Q(members=user)
+    ).values('id')
+    # Same membership the chat consumer checks, not the lazily created
+    # ChatParticipant rows
+    rooms = user.chat_rooms.values('id')
+    documents = SearchDocument.objects.filter(
+        Q(kind__in=['post', 'comment'], community_id__in=communities)
+        | Q(kind='message', room_id__in=rooms)
+    )
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    return documents
+
+
+def search(user, text, kinds=None, limit=20, offset=0):
+    text = (text or '').strip()
+    if not text:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    results = list(
+        get_search_backend()
+        .search(visible_documents(user, kinds), text)
+        .order_by('-rank', '-created_at')
+        .defer('body', 'search_vector')[offset:offset + limit]
+    )
+    attach_objects(results)
+    # Objects deleted without their document are dropped
+    return [result for result in results if result.object is not None]
+
+
+def attach_objects(results):
+    by_kind = {}
+    for result in results:
+        by_kind.setdefault(result.kind, []).append(result.object_id)
+    objects = {
+        kind: SOURCES[kind][1]().in_bulk(object_ids)
+        for kind, object_ids in by_kind.items()
+    }
+    if 'message' in objects:
+        # Messages moved to cold storage are read back from their segments
+        objects['message'].update(archived_messages([
+            (result.room_id, result.object_id, result.created_at)
+            for result in results
+            if result.kind == 'message' and result.object_id not in objects['message']
+        ]))
+    for result in results:
+        result.object = objects[result.kind].get(result.object_id)
@@ -0,0 +1,128 @@
+"""
+Keeping ``SearchDocument`` in step with posts, comments and chat messages.
+
+Saves and deletes are indexed one object at a time by the signal handlers;
+write-behind chat batches and ``reindex`` go through ``index_objects``,
+which upserts a whole batch with one ``bulk_create`` and one backend update.
+``reindex`` walks each source table in primary-key order and stores its
+progress in the cache after every batch, so an interrupted run resumes
+where it stopped.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.chat.models import Message
+from apps.posts.models import Comment, Post
+from .backends import get_search_backend
+from .models import SearchDocument
+
+logger = logging.getLogger(__name__)
+
+REINDEX_PROGRESS_KEY = 'search:reindex:{}'
+DOCUMENT_FIELDS = ['community_id', 'room_id', 'author_id', 'title', 'body', 'created_at']
+
+
+def post_document(post):
+    if not (post.is_published and post.is_approved):
+        return None
+    return SearchDocument(
+        kind='post', object_id=post.id, community_id=post.community_id,
+        author_id=post.author_id, title=post.title, body=post.content,
+        created_at=post.created_at,
+    )
+
+
+def comment_document(comment):
+    # Comments are only as visible as their post
+    if not (comment.post.is_published and comment.post.is_approved):
+        return None
+    return SearchDocument(
+        kind='comment', object_id=comment.id, community_id=comment.post.community_id,
+        author_id=comment.author_id, body=comment.content,
+        created_at=comment.created_at,
+    )
+
+
+def message_document(message):
+    return SearchDocument(
+        kind='message', object_id=message.id, room_id=message.room_id,
+        author_id=message.sender_id, body=message.content,
+        created_at=message.created_at,
+    )
+
+
+SOURCES = {
+    'post': (Post, lambda: Post.objects.all(), post_document),
+    'comment': (Comment, lambda: Comment.objects.select_related('post'), comment_document),
+    'message': (Message, lambda: Message.objects.all(), message_document),
+}
+
+
+def index_objects(kind, objects):
+    """Create or refresh the documents for ``objects`` of one ``kind``."""
+    _, _, build = SOURCES[kind]
+    documents, hidden = [], []
+    for obj in objects:
+        document = build(obj)
+        if document is None:
+            hidden.append(obj.id)
+        else:
+            documents.append(document)
+
+    with transaction.atomic():
+        if hidden:
+            remove_objects(kind, hidden)
+        if documents:
+            SearchDocument.objects.bulk_create(
+                documents,
+                update_conflicts=True,
+                unique_fields=['kind', 'object_id'],
+                update_fields=DOCUMENT_FIELDS,
+            )
+            document_ids = SearchDocument.objects.filter(
+                kind=kind, object_id__in=[document.object_id for document in documents]
+            ).values_list('id', flat=True)
+            get_search_backend().update(list(document_ids))
+    return len(documents)
+
+
+def remove_objects(kind, object_ids):
+    documents = SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids))
+    document_ids = list(documents.values_list('id', flat=True))
+    if document_ids:
+        get_search_backend().remove(document_ids)
+        SearchDocument.objects.filter(id__in=document_ids).delete()
+
+
+def index_post_comments(post_id, batch_size=None):
+    """Re-index a post's comments after its visibility or community changed."""
+    batch_size = batch_size or settings.SEARCH_REINDEX_BATCH_SIZE
+    comments = Comment.objects.select_related('post').filter(post_id=post_id).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(comments.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        index_objects('comment', batch)
+        last_id = batch[-1].id
+
+
+def reindex(kind, batch_size=None, restart=False):
+    """Index every object of ``kind``, resuming an interrupted run unless ``restart``."""
+    batch_size = batch_size or settings.SEARCH_REINDEX_BATCH_SIZE
+    _, queryset, _ = SOURCES[kind]
+    progress_key = REINDEX_PROGRESS_KEY.format(kind)
+    last_id = 0 if restart else cache.get(progress_key, 0)
+    indexed = 0
+    while True:
+        batch = list(queryset().filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            cache.delete(progress_key)
+            return indexed
+        indexed += index_objects(kind, batch)
+        last_id = batch[-1].id
+        cache.set(progress_key, last_id, None)
+        logger.info('Indexed %s up to id %s', kind, last_id)
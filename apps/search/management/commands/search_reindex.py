@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from apps.search.backends import get_search_backend
+from apps.search.indexing import SOURCES, reindex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index in batches, resuming an interrupted run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', choices=list(SOURCES), action='append',
+            help='Only reindex this kind (repeatable)'
+        )
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore saved progress and start from the first row'
+        )
+        parser.add_argument(
+            '--setup', action='store_true',
+            help='Create the full-text index structures first'
+        )
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            get_search_backend().install()
+        for kind in options['kind'] or SOURCES:
+            indexed = reindex(kind, options['batch_size'], options['restart'])
+            self.stdout.write(f'{kind}: indexed {indexed}')
@@ -0,0 +1,39 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+class SearchDocument(models.Model):
+    """
+    Denormalized searchable text of one post, comment or chat message, with
+    the community or room used to scope results (see apps/search/engine.py).
+    """
+    KINDS = [
+        ('post', 'Post'),
+        ('comment', 'Comment'),
+        ('message', 'Chat Message'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField()
+    community_id = models.BigIntegerField(null=True, blank=True)
+    room_id = models.BigIntegerField(null=True, blank=True)
+    author_id = models.BigIntegerField()
+    title = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    created_at = models.DateTimeField()
+    # Maintained by the PostgreSQL backend only
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    class Meta:
+        verbose_name = _('search document')
+        verbose_name_plural = _('search documents')
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'community_id']),
+            models.Index(fields=['kind', 'room_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.chat.models import Message
+from apps.posts.models import Comment, Post
+from .indexing import index_objects, index_post_comments, remove_objects
+
+KINDS = {Post: 'post', Comment: 'comment', Message: 'message'}
+INDEXED_FIELDS = {
+    Post: {'title', 'content', 'is_published', 'is_approved', 'community'},
+    Comment: {'content'},
+    Message: {'content'},
+}
+
+
+def _post_visibility(post):
+    # Everything a post's comment documents depend on
+    fields = post.__dict__
+    return fields.get('is_published'), fields.get('is_approved'), fields.get('community_id')
+
+
+@receiver(post_init, sender=Post)
+def remember_post_visibility(sender, instance, **kwargs):
+    instance._search_visibility = _post_visibility(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post_comments_on_visibility_change(sender, instance, created, raw=False, **kwargs):
+    visibility = _post_visibility(instance)
+    if raw or created or visibility == instance._search_visibility:
+        return
+    instance._search_visibility = visibility
+    post_id = instance.id
+    transaction.on_commit(lambda: index_post_comments(post_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Message)
+def index_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Saves of counters and other unindexed fields leave the index alone
+    if update_fields is not None and not INDEXED_FIELDS[sender].intersection(update_fields):
+        return
+    kind = KINDS[sender]
+    transaction.on_commit(lambda: index_objects(kind, [instance]))
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Message)
+def remove_deleted(sender, instance, **kwargs):
+    kind, object_id = KINDS[sender], instance.id
+    transaction.on_commit(lambda: remove_objects(kind, [object_id]))
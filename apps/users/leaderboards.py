@@ -0,0 +1,296 @@
+"""
+Engagement leaderboards.
+
+Users earn ``LEADERBOARD_POINTS`` for posting, commenting, receiving
+ratings (per star) and gaining followers. Points are kept per community
+(for post, comment and rating events) and globally, over three windows:
+
+``'all'``
+    One sorted set per scope.
+``'week'``
+    The last 7 days, summed from daily buckets.
+``'day'``
+    The last 24 hours, summed from hourly buckets.
+
+Every event increments the current hourly and daily buckets and the
+all-time set. The buckets expire once they can no longer be part of a window.
+A rolling board is materialized from its buckets with one union when it is
+read, and reused for ``LEADERBOARD_ROLLING_TTL`` seconds. Top-N,
+rank-of-user and page-around-user queries are then logarithmic lookups.
+
+The backend is chosen with ``LEADERBOARD_BACKEND``: Redis sorted sets, or
+``MemoryLeaderboardBackend`` (per process, for tests and development).
+"""
+import bisect
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from config.redis_client import get_redis
+
+WINDOWS = ('day', 'week', 'all')
+GLOBAL = 'global'
+
+
+class RedisLeaderboardBackend:
+    def incr(self, increments, ttls):
+        """Apply ``[(key, member, amount)]``; ``ttls`` maps keys to expiry seconds."""
+        pipe = get_redis().pipeline(transaction=False)
+        for key, member, amount in increments:
+            pipe.zincrby(key, amount, member)
+            if key in ttls:
+                pipe.expire(key, ttls[key])
+        pipe.execute()
+
+    def union(self, destination, keys, ttl):
+        pipe = get_redis().pipeline()
+        pipe.zunionstore(destination, keys)
+        pipe.expire(destination, ttl)
+        pipe.execute()
+
+    def exists(self, key):
+        return bool(get_redis().exists(key))
+
+    def top(self, key, start, stop):
+        return [
+            (int(member), score)
+            for member, score in get_redis().zrevrange(key, start, stop, withscores=True)
+        ]
+
+    def rank(self, key, member):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrevrank(key, member)
+        pipe.zscore(key, member)
+        rank, score = pipe.execute()
+        return (rank, score) if rank is not None else (None, 0)
+
+    def replace(self, key, scores):
+        pipe = get_redis().pipeline()
+        pipe.delete(key)
+        if scores:
+            pipe.zadd(key, scores)
+        pipe.execute()
+
+
+class _Board:
+    """Scores plus a list of ``(-score, member)`` kept sorted for ranking."""
+
+    def __init__(self):
+        self.scores = {}
+        self.ranking = []
+
+    def incr(self, member, amount):
+        old = self.scores.get(member)
+        if old is not None:
+            del self.ranking[bisect.bisect_left(self.ranking, (-old, member))]
+        score = (old or 0) + amount
+        self.scores[member] = score
+        bisect.insort(self.ranking, (-score, member))
+
+
+class MemoryLeaderboardBackend:
+    def __init__(self):
+        self.boards = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def _board(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.boards.pop(key, None)
+            self.expires.pop(key, None)
+        return self.boards.get(key)
+
+    def incr(self, increments, ttls):
+        with self.lock:
+            for key, member, amount in increments:
+                board = self._board(key)
+                if board is None:
+                    board = self.boards[key] = _Board()
+                board.incr(member, amount)
+                if key in ttls:
+                    self.expires[key] = time.time() + ttls[key]
+
+    def union(self, destination, keys, ttl):
+        with self.lock:
+            board = _Board()
+            for key in keys:
+                source = self._board(key)
+                for member, score in (source.scores.items() if source else ()):
+                    board.incr(member, score)
+            self.boards[destination] = board
+            self.expires[destination] = time.time() + ttl
+
+    def exists(self, key):
+        with self.lock:
+            return self._board(key) is not None
+
+    def top(self, key, start, stop):
+        with self.lock:
+            board = self._board(key)
+            if board is None:
+                return []
+            stop = None if stop == -1 else stop + 1
+            return [(member, -score) for score, member in board.ranking[start:stop]]
+
+    def rank(self, key, member):
+        with self.lock:
+            board = self._board(key)
+            if board is None or member not in board.scores:
+                return None, 0
+            score = board.scores[member]
+            return bisect.bisect_left(board.ranking, (-score, member)), score
+
+    def replace(self, key, scores):
+        with self.lock:
+            board = _Board()
+            for member, score in scores.items():
+                board.incr(member, score)
+            self.boards[key] = board
+            self.expires.pop(key, None)
+
+
+_backend = None
+
+
+def get_leaderboard_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.LEADERBOARD_BACKEND)()
+    return _backend
+
+
+def _hour(at):
+    return at.strftime('%Y%m%d%H')
+
+
+def _day(at):
+    return at.strftime('%Y%m%d')
+
+
+def board_key(scope, window, bucket=None):
+    return f'lb:{scope}:{window}' + (f':{bucket}' if bucket else '')
+
+
+def scope_for(community_id=None):
+    return GLOBAL if community_id is None else f'community:{community_id}'
+
+
+def award(user_id, event, multiplier=1, community_id=None):
+    """Give ``user_id`` the points for ``event``, after the transaction commits."""
+    points = settings.LEADERBOARD_POINTS[event] * multiplier
+    if not points or user_id is None:
+        return
+    now = timezone.now()
+    increments, ttls = [], {}
+    for scope in {GLOBAL, scope_for(community_id)}:
+        hourly = board_key(scope, 'hour', _hour(now))
+        daily = board_key(scope, 'daily', _day(now))
+        increments += [
+            (hourly, user_id, points),
+            (daily, user_id, points),
+            (board_key(scope, 'all'), user_id, points),
+        ]
+        # Kept a little longer than the windows they feed
+        ttls[hourly] = 25 * 60 * 60
+        ttls[daily] = 8 * 24 * 60 * 60
+    transaction.on_commit(lambda: get_leaderboard_backend().incr(increments, ttls))
+
+
+def _buckets(scope, window):
+    now = timezone.now()
+    if window == 'day':
+        return [board_key(scope, 'hour', _hour(now - timedelta(hours=h))) for h in range(24)]
+    return [board_key(scope, 'daily', _day(now - timedelta(days=d))) for d in range(7)]
+
+
+def _window_key(scope, window):
+    """Key of the board to query, materializing a rolling window if needed."""
+    if window not in WINDOWS:
+        raise ValueError(f'Unknown leaderboard window: {window!r}')
+    if window == 'all':
+        return board_key(scope, 'all')
+    backend = get_leaderboard_backend()
+    key = board_key(scope, window)
+    if not backend.exists(key):
+        backend.union(key, _buckets(scope, window), settings.LEADERBOARD_ROLLING_TTL)
+    return key
+
+
+def top(community_id=None, window='all', offset=0, limit=10):
+    """``[(rank, user_id, points)]`` from ``offset``, rank 1 being the leader."""
+    key = _window_key(scope_for(community_id), window)
+    entries = get_leaderboard_backend().top(key, offset, offset + limit - 1)
+    return [(offset + i + 1, user_id, points) for i, (user_id, points) in enumerate(entries)]
+
+
+def rank(user_id, community_id=None, window='all'):
+    """``(rank, points)`` of a user, with rank None if they have no points."""
+    key = _window_key(scope_for(community_id), window)
+    position, points = get_leaderboard_backend().rank(key, user_id)
+    return (None if position is None else position + 1), points
+
+
+def around(user_id, community_id=None, window='all', radius=5):
+    """The page of the board centred on ``user_id`` (empty if unranked)."""
+    position, _ = rank(user_id, community_id, window)
+    if position is None:
+        return []
+    offset = max(position - 1 - radius, 0)
+    return top(community_id, window, offset, 2 * radius + 1)
+
+
+def rebuild_all_time():
+    """
+    Recompute every all-time board from the database. Rolling windows are
+    only fed by live events.
+    """
+    from django.db.models import Count, Sum
+
+    from apps.posts.models import Comment, Post, PostRating
+    from .models import User
+
+    points = settings.LEADERBOARD_POINTS
+    boards = {}
+
+    def add(scope, user_id, amount):
+        if amount:
+            board = boards.setdefault(board_key(scope, 'all'), {})
+            board[user_id] = board.get(user_id, 0) + amount
+
+    def add_everywhere(community_id, user_id, amount):
+        for scope in {GLOBAL, scope_for(community_id)}:
+            add(scope, user_id, amount)
+
+    # Same rule as the live path: only published, approved posts count
+    posts = Post.objects.filter(is_published=True, is_approved=True)
+    for author_id, community_id, total in posts.values_list(
+        'author_id', 'community_id'
+    ).annotate(total=Count('id')).order_by():
+        add_everywhere(community_id, author_id, total * points['post'])
+    for author_id, community_id, total in Comment.objects.filter(
+        post__is_published=True, post__is_approved=True
+    ).values_list(
+        'author_id', 'post__community_id'
+    ).annotate(total=Count('id')).order_by():
+        add_everywhere(community_id, author_id, total * points['comment'])
+    for author_id, community_id, stars in PostRating.objects.filter(
+        post__is_published=True, post__is_approved=True
+    ).values_list(
+        'post__author_id', 'post__community_id'
+    ).annotate(stars=Sum('rating')).order_by():
+        add_everywhere(community_id, author_id, stars * points['rating'])
+    for user_id, followers in User.objects.annotate(
+        total=Count('followers')
+    ).filter(total__gt=0).values_list('id', 'total'):
+        add(GLOBAL, user_id, followers * points['follower'])
+
+    backend = get_leaderboard_backend()
+    for key, scores in boards.items():
+        backend.replace(key, scores)
+    return len(boards)
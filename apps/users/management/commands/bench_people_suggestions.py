@@ -0,0 +1,71 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.users.suggestions import FollowGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the friends-of-friends engine on a synthetic follower graph '
+        'held in memory; nothing is read from or written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--edges', type=int, default=1_000_000)
+        parser.add_argument('--communities', type=int, default=1000)
+        parser.add_argument('--joins', type=int, default=3)
+        parser.add_argument('--samples', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--k', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        users = options['users']
+        user_ids = np.arange(1, users + 1, dtype=np.int64)
+
+        # Followees are drawn from a heavy-tailed popularity distribution
+        popularity = rng.pareto(1.5, users) + 1
+        popularity /= popularity.sum()
+        followers = rng.integers(1, users + 1, options['edges'])
+        followees = rng.choice(user_ids, options['edges'], p=popularity)
+        members = np.repeat(user_ids, options['joins'])
+        communities = rng.integers(1, options['communities'] + 1, len(members))
+        strength = rng.integers(0, 100, users)
+
+        started = time.perf_counter()
+        graph = FollowGraph.from_edges(
+            user_ids, followers, followees, members, communities, strength
+        )
+        build = time.perf_counter() - started
+        self.stdout.write(
+            f'graph: {users} users, {graph.follows.nnz} edges, built in {build:.2f}s'
+        )
+
+        sample = rng.choice(users, min(options['samples'], users), replace=False)
+        batch_size = options['batch_size']
+        timings = []
+        candidates = 0
+        for start in range(0, len(sample), batch_size):
+            batch = sample[start:start + batch_size]
+            started = time.perf_counter()
+            results = graph.top_k(batch, options['k'])
+            timings.append((time.perf_counter() - started) / len(batch))
+            candidates += sum(len(result) for result in results)
+
+        per_user = statistics.mean(timings) * 1000
+        self.stdout.write(
+            f'top-{options["k"]}: {per_user:.3f}ms per user in batches of {batch_size}, '
+            f'{candidates / len(sample):.1f} suggestions per user; '
+            f'estimated full refresh {per_user * users / 1000:.1f}s'
+        )
+        started = time.perf_counter()
+        rows = graph.followers_of(sample[:batch_size])
+        self.stdout.write(
+            f'dirty expansion: {batch_size} users -> {len(rows)} rows '
+            f'in {(time.perf_counter() - started) * 1000:.1f}ms'
+        )
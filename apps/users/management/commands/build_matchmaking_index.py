@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import matchmaking
+
+
+class Command(BaseCommand):
+    help = 'Build the personality-tag matchmaking index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Only fold in users whose tags changed since the last build'
+        )
+
+    def handle(self, *args, **options):
+        if options['refresh']:
+            refreshed = matchmaking.refresh_index()
+            self.stdout.write(f'Refreshed {refreshed} users')
+            return
+        indexed = matchmaking.build_index()
+        index = matchmaking.get_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} users over {len(index.vocabulary)} tags ({index.version})'
+        ))
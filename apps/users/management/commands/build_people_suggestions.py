@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute "people you may know" suggestions for every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Only recompute users whose neighbourhood changed'
+        )
+
+    def handle(self, *args, **options):
+        if options['refresh']:
+            stored = suggestions.refresh()
+        else:
+            stored = suggestions.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Stored suggestions for {stored} users'))
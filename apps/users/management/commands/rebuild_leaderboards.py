@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recompute the all-time engagement leaderboards from the database'
+
+    def handle(self, *args, **options):
+        boards = leaderboards.rebuild_all_time()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {boards} leaderboards'))
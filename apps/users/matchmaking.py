@@ -0,0 +1,297 @@
+"""
+Matchmaking on ``User.personality_tags``.
+
+Every user's tag counts become one row of a sparse user x tag matrix:
+weights are ``log(1 + count)`` and each row is L2-normalized, so the dot
+product of two rows is their cosine similarity. Top-k similar users for a
+batch of users is one sparse matrix product followed by ``argpartition``.
+
+The index lives in ``MATCHMAKING_INDEX_DIR`` as a versioned directory of
+``.npy`` arrays (the CSR matrix and the sorted user ids) plus the tag
+vocabulary, with a ``current`` symlink to the live version. Workers open the
+arrays with ``mmap_mode='r'``, so every process on a host shares one copy
+through the page cache, and they pick up a new version by re-reading the
+symlink.
+
+Tag changes mark the user dirty in Redis. Until the next refresh, queries
+replace dirty users' indexed rows with vectors built from the database, so
+results are never stale. The ``refresh-matchmaking-index`` beat task then
+folds the dirty users into a new version. Only their rows are recomputed, and
+the rest of the matrix is copied across. Weights are per row (there is no
+global IDF), so an incremental refresh gives the same result as a full
+rebuild.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+
+from apps.core.dirty import DirtySet
+from .models import User
+
+dirty_users = DirtySet('matchmaking:pending')
+CURRENT = 'current'
+KEEP_VERSIONS = 2
+
+
+def _weights(tags, vocabulary, extend=False):
+    """``(columns, weights)`` for a tag dict, L2-normalized. Unknown tags are
+    added to ``vocabulary`` when ``extend`` and skipped otherwise."""
+    columns, weights = [], []
+    for tag, count in (tags or {}).items():
+        try:
+            count = float(count)
+        except (TypeError, ValueError):
+            continue
+        if count <= 0:
+            continue
+        column = vocabulary.get(tag)
+        if column is None:
+            if not extend:
+                continue
+            column = vocabulary[tag] = len(vocabulary)
+        columns.append(column)
+        weights.append(np.log1p(count))
+    weights = np.asarray(weights, dtype=np.float32)
+    norm = np.linalg.norm(weights)
+    if norm:
+        weights /= norm
+    return columns, weights
+
+
+def vectorize(rows, vocabulary, extend=False):
+    """CSR matrix with one row per tag dict in ``rows``."""
+    indptr, indices, data = [0], [], []
+    for tags in rows:
+        columns, weights = _weights(tags, vocabulary, extend)
+        indices.extend(columns)
+        data.append(weights)
+        indptr.append(len(indices))
+    data = np.concatenate(data) if data else np.zeros(0, dtype=np.float32)
+    return sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(vocabulary))
+    )
+
+
+class MatchmakingIndex:
+    def __init__(self, user_ids, matrix, vocabulary, version=None):
+        self.user_ids = user_ids
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        def array(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'vocabulary.json')) as f:
+            vocabulary = json.load(f)
+        user_ids = array('user_ids')
+        matrix = sparse.csr_matrix(
+            (array('data'), array('indices'), array('indptr')),
+            shape=(len(user_ids), len(vocabulary)),
+            copy=False
+        )
+        return cls(user_ids, matrix, vocabulary, version=os.path.basename(path))
+
+    def save(self, path):
+        os.makedirs(path)
+        matrix = self.matrix
+        for name, values in (
+            ('user_ids', np.asarray(self.user_ids, dtype=np.int64)),
+            ('data', matrix.data.astype(np.float32, copy=False)),
+            ('indices', matrix.indices.astype(np.int32, copy=False)),
+            ('indptr', matrix.indptr.astype(np.int64, copy=False)),
+        ):
+            np.save(os.path.join(path, f'{name}.npy'), values)
+        with open(os.path.join(path, 'vocabulary.json'), 'w') as f:
+            json.dump(self.vocabulary, f)
+
+    def rows_of(self, user_ids):
+        """Row of each id in ``user_ids``, or -1 when it is not indexed."""
+        indexed = np.asarray(self.user_ids)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(indexed):
+            return np.full(len(user_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(indexed, user_ids), len(indexed) - 1)
+        return np.where(indexed[rows] == user_ids, rows, -1)
+
+    def with_width(self, width):
+        """The matrix with ``width`` columns, sharing the stored arrays."""
+        matrix = self.matrix
+        return sparse.csr_matrix(
+            (matrix.data, matrix.indices, matrix.indptr),
+            shape=(matrix.shape[0], width),
+            copy=False
+        )
+
+
+def empty_index():
+    return MatchmakingIndex(
+        np.zeros(0, dtype=np.int64),
+        sparse.csr_matrix((0, 0), dtype=np.float32),
+        {}
+    )
+
+
+def _index_dir():
+    return str(settings.MATCHMAKING_INDEX_DIR)
+
+
+def publish(index):
+    """Write ``index`` as a new version and point ``current`` at it."""
+    root = _index_dir()
+    os.makedirs(root, exist_ok=True)
+    version = f'v{time.time_ns()}'
+    index.save(os.path.join(root, version))
+    link = os.path.join(root, f'{CURRENT}.tmp')
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(version, link)
+    os.replace(link, os.path.join(root, CURRENT))
+
+    # Processes still mapping an older version keep their open files
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v'))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    index.version = version
+    return version
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """The live index for this process, reloaded when a new version is published."""
+    global _index
+    current = os.path.join(_index_dir(), CURRENT)
+    try:
+        version = os.readlink(current)
+    except OSError:
+        return empty_index()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = MatchmakingIndex.load(os.path.join(_index_dir(), version))
+        return _index
+
+
+def mark_dirty(user_id):
+    dirty_users.mark([user_id])
+
+
+def _tags_by_user(user_ids):
+    users = User.objects.filter(id__in=list(user_ids), is_active=True)
+    return dict(users.values_list('id', 'personality_tags'))
+
+
+def build_index(batch_size=10000):
+    """Build and publish the whole index from the database."""
+    # Users marked before the export starts are covered by it
+    _, cutoff = dirty_users.snapshot()
+    vocabulary, user_ids, parts = {}, [], []
+    users = User.objects.filter(is_active=True).order_by('id').values_list('id', 'personality_tags')
+    batch = []
+    for user_id, tags in users.iterator(chunk_size=batch_size):
+        user_ids.append(user_id)
+        batch.append(tags)
+        if len(batch) == batch_size:
+            parts.append(vectorize(batch, vocabulary, extend=True))
+            batch = []
+    if batch:
+        parts.append(vectorize(batch, vocabulary, extend=True))
+    # Earlier parts were built with a smaller vocabulary
+    parts = [part.tocsr() for part in parts]
+    for part in parts:
+        part.resize(part.shape[0], len(vocabulary))
+    matrix = sparse.vstack(parts, format='csr') if parts else sparse.csr_matrix((0, 0))
+    index = MatchmakingIndex(np.asarray(user_ids, dtype=np.int64), matrix, vocabulary)
+    publish(index)
+    dirty_users.done(cutoff)
+    return len(user_ids)
+
+
+def refresh_index():
+    """Fold the users marked dirty into a new index version."""
+    dirty, cutoff = dirty_users.snapshot()
+    if not dirty:
+        return 0
+    base = get_index()
+    vocabulary = dict(base.vocabulary)
+    users = dict(
+        User.objects.filter(id__in=dirty, is_active=True).values_list('id', 'personality_tags')
+    )
+    changed_ids = np.asarray(sorted(users), dtype=np.int64)
+    changed = vectorize([users[user_id] for user_id in changed_ids], vocabulary, extend=True)
+
+    keep = np.ones(len(base.user_ids), dtype=bool)
+    rows = base.rows_of(dirty)
+    keep[rows[rows >= 0]] = False
+    kept = base.matrix[keep]
+    kept.resize(kept.shape[0], len(vocabulary))
+    changed.resize(changed.shape[0], len(vocabulary))
+
+    user_ids = np.concatenate([np.asarray(base.user_ids)[keep], changed_ids])
+    order = np.argsort(user_ids, kind='stable')
+    matrix = sparse.vstack([kept, changed], format='csr')[order]
+    publish(MatchmakingIndex(user_ids[order], matrix, vocabulary))
+    # Users marked again while we were building stay dirty
+    dirty_users.done(cutoff)
+    return len(dirty)
+
+
+def similar_users_batch(user_ids, k=10):
+    """
+    ``{user_id: [(other_id, score), ...]}`` with the ``k`` most similar users
+    for each of ``user_ids``, best first.
+    """
+    user_ids = [int(user_id) for user_id in user_ids]
+    index = get_index()
+    dirty = dirty_users.members()
+    vocabulary = dict(index.vocabulary)
+    # Dirty users and the queried users are vectorized from the database;
+    # their indexed rows are hidden so each user is scored once
+    tags = _tags_by_user(dirty.union(user_ids))
+    live = np.asarray(sorted(tags), dtype=np.int64)
+    live_matrix = vectorize([tags[user_id] for user_id in live.tolist()], vocabulary, extend=True)
+    indexed = index.with_width(len(vocabulary))
+
+    candidates = np.concatenate([np.asarray(index.user_ids), live])
+    hidden = np.zeros(len(candidates), dtype=bool)
+    stale = index.rows_of(live)
+    hidden[stale[stale >= 0]] = True
+
+    live_rows = {user_id: row for row, user_id in enumerate(live.tolist())}
+    queried = [user_id for user_id in user_ids if user_id in live_rows]
+    results = {user_id: [] for user_id in user_ids}
+    batch_size = settings.MATCHMAKING_QUERY_BATCH_SIZE
+    for start in range(0, len(queried), batch_size):
+        chunk_ids = queried[start:start + batch_size]
+        chunk = live_matrix[[live_rows[user_id] for user_id in chunk_ids]]
+        # Only users sharing a tag get a score, so this stays sparse
+        scores = sparse.hstack([chunk @ indexed.T, chunk @ live_matrix.T], format='csr')
+        for offset, user_id in enumerate(chunk_ids):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            keep = ~hidden[columns] & (candidates[columns] != user_id) & (values > 0)
+            columns, values = columns[keep], values[keep]
+            top = min(k, len(values))
+            if not top:
+                continue
+            best = np.argpartition(-values, top - 1)[:top]
+            best = best[np.argsort(-values[best])]
+            results[user_id] = [
+                (int(candidates[columns[i]]), float(values[i])) for i in best
+            ]
+    return results
+
+
+def similar_users(user, k=10):
+    return similar_users_batch([user.id], k)[user.id]
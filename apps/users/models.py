@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 
 class User(AbstractUser):
@@ -51,19 +52,35 @@ class User(AbstractUser):
         return self.first_name
     
     def update_connection_strength(self, increment=1):
-        self.connection_strength += increment
-        self.save()
+        User.objects.filter(pk=self.pk).update(
+            connection_strength=F('connection_strength') + increment
+        )
+        self.refresh_from_db(fields=['connection_strength'])
     
     def add_personality_tag(self, tag):
-        if not self.personality_tags:
-            self.personality_tags = {}
-        if tag not in self.personality_tags:
-            self.personality_tags[tag] = 1
-        else:
-            self.personality_tags[tag] += 1
-        self.save()
+        from . import tags
+        tags.increment_tag(self.pk, tag)
+        self.refresh_from_db(fields=['personality_tags'])
+        self.personality_tags_changed([self.pk])
     
     def remove_personality_tag(self, tag):
-        if self.personality_tags and tag in self.personality_tags:
-            del self.personality_tags[tag]
-            self.save() 
\ No newline at end of file
+        from . import tags
+        if tags.remove_tag(self.pk, tag):
+            self.refresh_from_db(fields=['personality_tags'])
+            self.personality_tags_changed([self.pk])
+    
+    @classmethod
+    def add_personality_tags(cls, deltas):
+        """Apply ``{user_id: {tag: increment}}`` in one statement."""
+        from . import tags
+        updated = tags.increment_tags(deltas)
+        cls.personality_tags_changed(list(deltas))
+        return updated
+    
+    @staticmethod
+    def personality_tags_changed(user_ids):
+        from . import matchmaking
+        def mark():
+            for user_id in user_ids:
+                matchmaking.mark_dirty(user_id)
+        transaction.on_commit(mark)
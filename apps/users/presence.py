@@ -0,0 +1,167 @@
+"""
+Online presence.
+
+A user is online while at least one of their connections (a websocket, a
+tab, a device) has sent a connect or heartbeat within ``PRESENCE_TTL``
+seconds. ``ChatConsumer`` reports connects, disconnects and heartbeat frames.
+
+The backend is chosen with ``PRESENCE_BACKEND``:
+
+``RedisPresenceBackend``
+    Online users live in ``PRESENCE_SHARDS`` sorted sets keyed by
+    ``user_id % PRESENCE_SHARDS`` and scored by expiry time, so no single key
+    grows with the whole user base. Each user's live connections are tracked
+    in a per-user sorted set so closing one tab does not mark them offline.
+    Batch lookups cost one ``ZMSCORE`` per shard touched.
+
+``LocalPresenceBackend``
+    In-process dictionaries with the same semantics, for tests and
+    single-process development.
+
+Expired entries are ignored on read; ``sweep`` (run by the
+``sweep_presence`` beat task) only reclaims memory.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from config.redis_client import get_redis
+
+ONLINE_KEY = 'presence:online:{}'
+CONNECTIONS_KEY = 'presence:conns:{}'
+
+# Drop one connection; clear the user from their shard once none are left
+DISCONNECT_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+local remaining = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #remaining == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    return 0
+end
+redis.call('ZADD', KEYS[2], remaining[2], ARGV[3])
+return 1
+"""
+
+
+class RedisPresenceBackend:
+    def __init__(self, ttl, shards):
+        self.ttl = ttl
+        self.shards = shards
+        self._disconnect = None
+
+    def shard_key(self, user_id):
+        return ONLINE_KEY.format(int(user_id) % self.shards)
+
+    def touch(self, user_id, connection_id):
+        expires = time.time() + self.ttl
+        connections = CONNECTIONS_KEY.format(user_id)
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zadd(connections, {connection_id: expires})
+        pipe.expire(connections, self.ttl * 2)
+        pipe.zadd(self.shard_key(user_id), {user_id: expires}, gt=True)
+        pipe.execute()
+
+    def disconnect(self, user_id, connection_id):
+        if self._disconnect is None:
+            self._disconnect = get_redis().register_script(DISCONNECT_SCRIPT)
+        self._disconnect(
+            keys=[CONNECTIONS_KEY.format(user_id), self.shard_key(user_id)],
+            args=[connection_id, time.time(), user_id]
+        )
+
+    def online(self, user_ids):
+        by_shard = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[self.shard_key(user_id)].append(user_id)
+        pipe = get_redis().pipeline(transaction=False)
+        for key, members in by_shard.items():
+            pipe.zmscore(key, members)
+        now = time.time()
+        online = set()
+        for members, scores in zip(by_shard.values(), pipe.execute()):
+            online.update(
+                user_id for user_id, score in zip(members, scores)
+                if score is not None and score > now
+            )
+        return online
+
+    def sweep(self):
+        now = time.time()
+        pipe = get_redis().pipeline(transaction=False)
+        for shard in range(self.shards):
+            pipe.zremrangebyscore(ONLINE_KEY.format(shard), '-inf', now)
+        return sum(pipe.execute())
+
+
+class LocalPresenceBackend:
+    def __init__(self, ttl, shards=None):
+        self.ttl = ttl
+        self.connections = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def touch(self, user_id, connection_id):
+        with self.lock:
+            self.connections[user_id][connection_id] = time.time() + self.ttl
+
+    def disconnect(self, user_id, connection_id):
+        with self.lock:
+            self.connections[user_id].pop(connection_id, None)
+            if not self.connections[user_id]:
+                del self.connections[user_id]
+
+    def online(self, user_ids):
+        now = time.time()
+        with self.lock:
+            return {
+                user_id for user_id in user_ids
+                if any(expires > now for expires in self.connections.get(user_id, {}).values())
+            }
+
+    def sweep(self):
+        now = time.time()
+        removed = 0
+        with self.lock:
+            for user_id in list(self.connections):
+                live = {c: e for c, e in self.connections[user_id].items() if e > now}
+                if live:
+                    self.connections[user_id] = live
+                else:
+                    del self.connections[user_id]
+                    removed += 1
+        return removed
+
+
+_backend = None
+
+
+def get_presence_backend():
+    global _backend
+    if _backend is None:
+        backend_class = import_string(settings.PRESENCE_BACKEND)
+        _backend = backend_class(settings.PRESENCE_TTL, settings.PRESENCE_SHARDS)
+    return _backend
+
+
+def user_connected(user_id, connection_id):
+    get_presence_backend().touch(user_id, connection_id)
+
+
+def user_heartbeat(user_id, connection_id):
+    get_presence_backend().touch(user_id, connection_id)
+
+
+def user_disconnected(user_id, connection_id):
+    get_presence_backend().disconnect(user_id, connection_id)
+
+
+def online_user_ids(user_ids):
+    """The subset of ``user_ids`` that is online, without touching the database."""
+    return get_presence_backend().online(list(user_ids))
+
+
+def is_online(user_id):
+    return user_id in online_user_ids([user_id])
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from apps.communities.models import Community
+from . import leaderboards, suggestions
+from .models import User
+
+
+def _mark(user_ids):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: suggestions.mark_dirty(user_ids))
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Suggestions change for the follower; their own followers are added
+    # when the suggestions are refreshed
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _mark([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _mark(pk_set or ())
+    elif action == 'pre_clear':
+        _mark(instance.followers.values_list('id', flat=True))
+
+
+def _existing_follows(instance, reverse, pk_set):
+    # a.followers.add(b) stores from_user=a, to_user=b: b follows a
+    through = User.followers.through
+    if reverse:
+        links = through.objects.filter(to_user_id=instance.pk)
+        if pk_set is not None:
+            links = links.filter(from_user_id__in=pk_set)
+        return list(links.values_list('from_user_id', flat=True))
+    links = through.objects.filter(from_user_id=instance.pk)
+    if pk_set is not None:
+        links = links.filter(to_user_id__in=pk_set)
+    return list(links.values_list('to_user_id', flat=True))
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def follows_leaderboard(sender, instance, action, reverse, pk_set, **kwargs):
+    # Points go to whoever gained (or lost) a follower
+    if action in ('pre_remove', 'pre_clear'):
+        # pk_set for remove lists what was asked for, not what existed
+        instance._leaderboard_unfollowed = _existing_follows(instance, reverse, pk_set)
+        return
+    if action == 'post_add':
+        ids, multiplier = pk_set or (), 1
+    elif action in ('post_remove', 'post_clear'):
+        ids, multiplier = instance.__dict__.pop('_leaderboard_unfollowed', ()), -1
+    else:
+        return
+    if reverse:
+        for user_id in ids:
+            leaderboards.award(user_id, 'follower', multiplier)
+    elif ids:
+        leaderboards.award(instance.pk, 'follower', multiplier * len(ids))
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def memberships_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _mark([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _mark(pk_set or ())
+    elif action == 'pre_clear':
+        _mark(instance.members.values_list('id', flat=True))
@@ -0,0 +1,203 @@
+"""
+"People you may know" from the follower graph.
+
+The follow edges are exported into a CSR adjacency matrix ``A`` (``A[i, j]``
+is 1 when user ``i`` follows user ``j``), with users mapped to rows through a
+sorted id array. Candidates for a batch of users are the rows of
+``A[batch] @ W @ A``: people followed by the people they follow, each path
+weighted by ``1 / log(2 + out-degree)`` of the middle user so prolific
+followers count for less. Each candidate's score then gets
+``PYMK_COMMUNITY_WEIGHT`` per community shared with the user and
+``PYMK_STRENGTH_WEIGHT * log(1 + connection_strength)``. People already
+followed, and the user themselves, are excluded.
+
+The top ``PYMK_TOP_K`` per user are stored in a Redis sorted set. Follow and
+membership changes mark the users involved as dirty. The
+``refresh-people-suggestions`` beat task re-exports the graph and recomputes
+only the rows that can have changed: the dirty users, their followers (whose
+two-hop neighbourhood runs through them) and their followers' followers (for
+whom they are a candidate, with a changed community overlap). Connection
+strength is not tracked per change, so ``rebuild-people-suggestions``
+recomputes everyone nightly.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+
+from apps.communities.models import Community
+from apps.core.dirty import DirtySet
+from config.redis_client import get_redis
+from .models import User
+
+SUGGESTIONS_KEY = 'pymk:{}'
+dirty_users = DirtySet('pymk:pending')
+
+
+def rows_of(sorted_ids, user_ids):
+    """Position of each of ``user_ids`` in ``sorted_ids``, or -1 when absent."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(user_ids), -1, dtype=np.int64)
+    rows = np.minimum(np.searchsorted(sorted_ids, user_ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[rows] == user_ids, rows, -1)
+
+
+class FollowGraph:
+    def __init__(self, user_ids, follows, memberships, strength):
+        self.user_ids = user_ids
+        self.follows = follows
+        self.followed_by = follows.T.tocsr()
+        self.memberships = memberships
+        out_degree = np.diff(follows.indptr)
+        self.path_weights = sparse.diags((1 / np.log(2 + out_degree)).astype(np.float32))
+        self.boost = (
+            settings.PYMK_STRENGTH_WEIGHT * np.log1p(np.maximum(strength, 0))
+        ).astype(np.float32)
+
+    @classmethod
+    def from_edges(cls, user_ids, followers, followees, members=(), communities=(), strength=None):
+        """
+        Build the graph from parallel id arrays: ``followers[i]`` follows
+        ``followees[i]`` and ``members[i]`` belongs to ``communities[i]``.
+        Edges touching users outside ``user_ids`` are dropped.
+        """
+        order = np.argsort(np.asarray(user_ids, dtype=np.int64))
+        user_ids = np.asarray(user_ids, dtype=np.int64)[order]
+        n = len(user_ids)
+        if strength is None:
+            strength = np.zeros(n, dtype=np.float32)
+        else:
+            strength = np.asarray(strength, dtype=np.float32)[order]
+
+        sources, targets = rows_of(user_ids, followers), rows_of(user_ids, followees)
+        keep = (sources >= 0) & (targets >= 0) & (sources != targets)
+        follows = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.float32), (sources[keep], targets[keep])),
+            shape=(n, n)
+        )
+        # Duplicate edges were summed
+        follows.data[:] = 1
+
+        rows = rows_of(user_ids, members)
+        communities = np.asarray(communities, dtype=np.int64)
+        keep = rows >= 0
+        _, columns = np.unique(communities[keep], return_inverse=True)
+        memberships = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.float32), (rows[keep], columns)),
+            shape=(n, int(columns.max()) + 1 if len(columns) else 0)
+        )
+        memberships.data[:] = 1
+        return cls(user_ids, follows, memberships, strength)
+
+    @classmethod
+    def from_database(cls):
+        users = np.array(
+            list(User.objects.filter(is_active=True).values_list('id', 'connection_strength')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        # a.followers.add(b) stores from_user=a, to_user=b: b follows a
+        follows = np.array(
+            list(User.followers.through.objects.values_list('to_user_id', 'from_user_id')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        members = np.array(
+            list(Community.members.through.objects.values_list('user_id', 'community_id')),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        return cls.from_edges(
+            users[:, 0], follows[:, 0], follows[:, 1],
+            members[:, 0], members[:, 1], strength=users[:, 1]
+        )
+
+    def rows_of(self, user_ids):
+        return rows_of(self.user_ids, user_ids)
+
+    def followers_of(self, rows):
+        """Rows of every user following any of ``rows``."""
+        return np.unique(self.followed_by[rows].indices)
+
+    def top_k(self, rows, k):
+        """``[[(user_id, score), ...], ...]`` for each row in ``rows``, best first."""
+        rows = np.asarray(rows, dtype=np.int64)
+        hops = self.follows[rows]
+        two_hop = (hops @ self.path_weights @ self.follows).tocsr()
+        results = []
+        for offset, row in enumerate(rows):
+            begin, end = two_hop.indptr[offset], two_hop.indptr[offset + 1]
+            candidates = two_hop.indices[begin:end]
+            scores = two_hop.data[begin:end].copy()
+            followed = hops.indices[hops.indptr[offset]:hops.indptr[offset + 1]]
+            keep = (candidates != row) & ~np.isin(candidates, followed)
+            candidates, scores = candidates[keep], scores[keep]
+            if not len(candidates):
+                results.append([])
+                continue
+            if self.memberships.shape[1]:
+                shared = self.memberships[candidates] @ self.memberships[row].T
+                scores += settings.PYMK_COMMUNITY_WEIGHT * shared.toarray().ravel()
+            scores += self.boost[candidates]
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results.append([
+                (int(self.user_ids[candidates[i]]), float(scores[i])) for i in best
+            ])
+        return results
+
+
+def store(graph, rows, k=None, batch_size=None):
+    """Recompute and store the suggestions of ``rows``."""
+    k = k or settings.PYMK_TOP_K
+    batch_size = batch_size or settings.PYMK_BATCH_SIZE
+    client = get_redis()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        pipe = client.pipeline()
+        for row, suggestions in zip(batch, graph.top_k(batch, k)):
+            key = SUGGESTIONS_KEY.format(graph.user_ids[row])
+            pipe.delete(key)
+            if suggestions:
+                pipe.zadd(key, dict(suggestions))
+        pipe.execute()
+    return len(rows)
+
+
+def rebuild_all():
+    _, cutoff = dirty_users.snapshot()
+    graph = FollowGraph.from_database()
+    stored = store(graph, np.arange(len(graph.user_ids)))
+    dirty_users.done(cutoff)
+    return stored
+
+
+def refresh():
+    """Recompute the users whose neighbourhood changed since the last run."""
+    dirty, cutoff = dirty_users.snapshot()
+    if not dirty:
+        return 0
+    graph = FollowGraph.from_database()
+    rows = graph.rows_of(dirty)
+    rows = rows[rows >= 0]
+    followers = graph.followers_of(rows)
+    rows = np.union1d(np.union1d(rows, followers), graph.followers_of(followers))
+    stored = store(graph, rows)
+    # Users marked again while we were computing stay dirty
+    dirty_users.done(cutoff)
+    return stored
+
+
+def mark_dirty(user_ids):
+    dirty_users.mark(user_ids)
+
+
+def suggested_users(user, limit=20):
+    """Stored suggestions for ``user`` as ``User`` objects, best first."""
+    ranked = [
+        int(user_id)
+        for user_id in get_redis().zrevrange(SUGGESTIONS_KEY.format(user.id), 0, limit * 2)
+    ]
+    # Drop anyone followed since the suggestions were computed
+    followed = set(user.following.filter(id__in=ranked).values_list('id', flat=True))
+    users = User.objects.filter(id__in=ranked, is_active=True).in_bulk()
+    return [users[pk] for pk in ranked if pk in users and pk not in followed][:limit]
@@ -0,0 +1,95 @@
+"""
+Atomic updates of ``User.personality_tags``.
+
+Tag counts are changed by a single UPDATE that edits the JSON document in
+the database (``jsonb`` operators on PostgreSQL, the JSON1 functions on
+SQLite). Concurrent increments therefore never overwrite each other, and no
+other column of the user row is rewritten. ``increment_tags`` applies any
+number of increments for any number of users in one statement on
+PostgreSQL.
+"""
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from apps.core.encoding import dumps
+from .models import User
+
+
+def _sqlite_path(tag):
+    return '$."{}"'.format(tag.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def increment_expression(tag, delta):
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            "jsonb_set(COALESCE(personality_tags, '{}'::jsonb), ARRAY[%s], "
+            "to_jsonb(COALESCE((personality_tags ->> %s)::numeric, 0) + %s))",
+            [tag, tag, delta]
+        )
+    return RawSQL(
+        "json_set(COALESCE(personality_tags, '{}'), %s, "
+        "COALESCE(json_extract(personality_tags, %s), 0) + %s)",
+        [_sqlite_path(tag), _sqlite_path(tag), delta]
+    )
+
+
+def remove_expression(tag):
+    if connection.vendor == 'postgresql':
+        return RawSQL("COALESCE(personality_tags, '{}'::jsonb) - %s", [tag])
+    return RawSQL("json_remove(COALESCE(personality_tags, '{}'), %s)", [_sqlite_path(tag)])
+
+
+def increment_tag(user_id, tag, delta=1):
+    return User.objects.filter(pk=user_id).update(
+        personality_tags=increment_expression(tag, delta)
+    )
+
+
+def remove_tag(user_id, tag):
+    """Remove ``tag``; returns 0 when the user did not have it."""
+    return User.objects.filter(pk=user_id, personality_tags__has_key=tag).update(
+        personality_tags=remove_expression(tag)
+    )
+
+
+def increment_tags(deltas):
+    """
+    Apply ``{user_id: {tag: delta}}`` atomically. Returns the number of users
+    updated.
+    """
+    deltas = {user_id: tags for user_id, tags in deltas.items() if tags}
+    if not deltas:
+        return 0
+    if connection.vendor != 'postgresql':
+        updated = 0
+        with transaction.atomic():
+            for user_id, tags in deltas.items():
+                expression = "COALESCE(personality_tags, '{}')"
+                params = []
+                for tag, delta in tags.items():
+                    expression = (
+                        f'json_set({expression}, %s, '
+                        f'COALESCE(json_extract(personality_tags, %s), 0) + %s)'
+                    )
+                    params += [_sqlite_path(tag), _sqlite_path(tag), delta]
+                updated += User.objects.filter(pk=user_id).update(
+                    personality_tags=RawSQL(expression, params)
+                )
+        return updated
+
+    table = connection.ops.quote_name(User._meta.db_table)
+    values = ', '.join(['(%s, %s::jsonb)'] * len(deltas))
+    params = []
+    for user_id, tags in deltas.items():
+        params += [user_id, dumps(tags)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} AS u SET personality_tags = '
+            f"COALESCE(u.personality_tags, '{{}}'::jsonb) || ("
+            f'SELECT jsonb_object_agg(d.key, '
+            f'COALESCE((u.personality_tags ->> d.key)::numeric, 0) + d.value::numeric) '
+            f'FROM jsonb_each_text(v.deltas) AS d) '
+            f'FROM (VALUES {values}) AS v(id, deltas) WHERE u.id = v.id',
+            params
+        )
+        return cursor.rowcount
@@ -0,0 +1,23 @@
+from config.celery import app
+from . import matchmaking, suggestions
+from .presence import get_presence_backend
+
+
+@app.task(ignore_result=True)
+def sweep_presence():
+    return get_presence_backend().sweep()
+
+
+@app.task(ignore_result=True)
+def refresh_matchmaking_index():
+    return matchmaking.refresh_index()
+
+
+@app.task(ignore_result=True)
+def refresh_people_suggestions():
+    return suggestions.refresh()
+
+
+@app.task(ignore_result=True)
+def rebuild_people_suggestions():
+    return suggestions.rebuild_all()
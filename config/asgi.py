@@ -5,6 +5,7 @@ from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.urls import path
 from apps.chat.consumers import ChatConsumer
+from apps.notifications.consumers import NotificationConsumer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.development')
 
@@ -18,6 +19,7 @@ application = ProtocolTypeRouter({
         AuthMiddlewareStack(
             URLRouter([
                 path("ws/chat/<str:room_name>/", ChatConsumer.as_asgi()),
+                path("ws/notifications/", NotificationConsumer.as_asgi()),
             ])
         )
     ),
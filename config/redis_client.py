@@ -0,0 +1,18 @@
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    """Return the process-wide synchronous Redis client."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def get_async_redis():
+    """Return a new asyncio Redis client bound to the running event loop."""
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL)
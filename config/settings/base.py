@@ -41,11 +41,13 @@ INSTALLED_APPS = [
     'debug_toolbar',
     
     # Local apps
+    'apps.core',
     'apps.users',
     'apps.communities',
     'apps.posts',
     'apps.chat',
     'apps.notifications',
+    'apps.search',
 ]
 
 MIDDLEWARE = [
@@ -156,6 +158,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # List views over posts, messages and notifications opt into
+    # apps.core.pagination.KeysetPagination with pagination_class
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -166,16 +170,142 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+# Redis
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
 # Channels settings
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [os.getenv('REDIS_URL', 'redis://localhost:6379/0')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Chat write-behind persistence (see apps/chat/write_behind.py).
+# When enabled, chat messages are broadcast before they are stored and
+# written to the database in batches of up to CHAT_WRITE_BEHIND_BATCH_SIZE
+# rows or every CHAT_WRITE_BEHIND_FLUSH_INTERVAL seconds, whichever comes
+# first. CHAT_WRITE_BEHIND_DURABILITY is 'memory' (a crashed worker loses
+# its unflushed batch) or 'journal' (messages are appended to Redis before
+# being broadcast and recovered by the recover_chat_write_behind task).
+CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False') == 'True'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BEHIND_BATCH_SIZE', 100))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+CHAT_WRITE_BEHIND_DURABILITY = os.getenv('CHAT_WRITE_BEHIND_DURABILITY', 'journal')
+CHAT_WRITE_BEHIND_JOURNAL_TTL = 60
+
+# Typing indicators (see apps/chat/typing.py), in seconds
+CHAT_TYPING_TIMEOUT = 6
+CHAT_TYPING_BROADCAST_INTERVAL = 1
+
+# Presence (see apps/users/presence.py). Clients must send a heartbeat
+# frame more often than PRESENCE_TTL seconds to stay online.
+PRESENCE_BACKEND = 'apps.users.presence.RedisPresenceBackend'
+PRESENCE_TTL = 60
+PRESENCE_SHARDS = 64
+
+# Counter caches (see apps/core/counters.py). When buffered, deltas are
+# collected in Redis and written by the flush-counter-caches beat task.
+COUNTER_CACHE_BUFFER = os.getenv('COUNTER_CACHE_BUFFER', 'False') == 'True'
+
+# Post view counting (see apps/posts/view_counts.py): 'redis' or 'memory'.
+# POST_VIEW_DEDUP_WINDOW is in seconds; 0 counts every view.
+POST_VIEW_COUNT_BACKEND = os.getenv('POST_VIEW_COUNT_BACKEND', 'redis')
+POST_VIEW_DEDUP_WINDOW = 30 * 60
+POST_VIEW_FLUSH_THRESHOLD = 1000
+POST_VIEW_FLUSH_INTERVAL = 10
+
+# Home feed timelines (see apps/posts/feeds.py). Posts from authors or
+# communities above the fan-out limits are pulled at read time instead.
+FEED_TIMELINE_LENGTH = 800
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_FANOUT_MAX_MEMBERS = 10000
+
+# Notification fan-out: rows written per bulk INSERT
+NOTIFICATION_FANOUT_BATCH_SIZE = 500
+
+# Unread badge counters (see apps/notifications/unread.py), in seconds
+UNREAD_COUNTER_TTL = 7 * 24 * 60 * 60
+
+# Retention (see apps/core/partitions.py). On PostgreSQL chat messages are
+# partitioned by month once `manage.py partition_messages` has run; the
+# maintain-partitions beat task keeps CHAT_MESSAGE_PARTITIONS_AHEAD months
+# ready and drops months older than CHAT_MESSAGE_RETENTION_DAYS (unset keeps
+# messages forever). Read notifications are deleted after
+# NOTIFICATION_READ_RETENTION_DAYS and all notifications after
+# NOTIFICATION_RETENTION_DAYS.
+CHAT_MESSAGE_PARTITIONS_AHEAD = 3
+CHAT_MESSAGE_RETENTION_DAYS = int(os.getenv('CHAT_MESSAGE_RETENTION_DAYS', 0)) or None
+NOTIFICATION_READ_RETENTION_DAYS = int(os.getenv('NOTIFICATION_READ_RETENTION_DAYS', 30))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 365))
+RETENTION_DELETE_BATCH_SIZE = 5000
+
+# Chat history archival (see apps/chat/archive.py). Messages older than
+# CHAT_ARCHIVE_AFTER_DAYS are moved into compressed segment files on the
+# default storage backend by the archive-chat-history beat task.
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', 90))
+CHAT_ARCHIVE_SEGMENT_SIZE = 1000
+CHAT_ARCHIVE_CACHE_TIMEOUT = 60 * 60
+
+# Full-text search (see apps/search). SEARCH_CONFIG is the PostgreSQL text
+# search configuration; SQLite uses an FTS5 table instead.
+SEARCH_CONFIG = 'english'
+SEARCH_REINDEX_BATCH_SIZE = 1000
+
+# Matchmaking index (see apps/users/matchmaking.py). The directory must be
+# on local disk shared by the workers of a host; build it with
+# `manage.py build_matchmaking_index`.
+MATCHMAKING_INDEX_DIR = os.getenv('MATCHMAKING_INDEX_DIR', BASE_DIR / 'var' / 'matchmaking')
+MATCHMAKING_QUERY_BATCH_SIZE = 256
+
+# People you may know (see apps/users/suggestions.py)
+PYMK_TOP_K = 50
+PYMK_BATCH_SIZE = 1000
+PYMK_COMMUNITY_WEIGHT = 0.5
+PYMK_STRENGTH_WEIGHT = 0.1
+
+# Community recommendations (see apps/communities/recommendations.py).
+# COMMUNITY_RECS_SIMILARITY is 'cosine' or 'jaccard'.
+COMMUNITY_RECS_SIMILARITY = 'cosine'
+COMMUNITY_RECS_NEIGHBORS = 50
+COMMUNITY_RECS_TOP_N = 20
+COMMUNITY_RECS_BATCH_SIZE = 1000
+COMMUNITY_RECS_INCLUDE_PREMIUM = False
+
+# Trending posts (see apps/posts/trending.py). Engagement loses half its
+# weight every TRENDING_HALF_LIFE seconds; ratings are weighted per star.
+TRENDING_HALF_LIFE = 12 * 60 * 60
+TRENDING_WEIGHTS = {
+    'post': 10,
+    'view': 1,
+    'comment': 5,
+    'rating': 1,
+}
+TRENDING_MAX_POSTS = 10000
+TRENDING_BACKFILL_DAYS = 7
+
+# Engagement leaderboards (see apps/users/leaderboards.py). Ratings earn
+# the post's author points per star; rolling day/week boards are
+# recomputed from their buckets at most every LEADERBOARD_ROLLING_TTL seconds.
+LEADERBOARD_BACKEND = 'apps.users.leaderboards.RedisLeaderboardBackend'
+LEADERBOARD_POINTS = {
+    'post': 10,
+    'comment': 3,
+    'rating': 1,
+    'follower': 5,
+}
+LEADERBOARD_ROLLING_TTL = 60
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -213,9 +343,56 @@ SOCIALACCOUNT_PROVIDERS = {
 }
 
 # Celery settings
-CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE 
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE 
+
+CELERY_BEAT_SCHEDULE = {
+    'recover-chat-write-behind': {
+        'task': 'apps.chat.tasks.recover_chat_write_behind',
+        'schedule': 30.0,
+    },
+    'flush-counter-caches': {
+        'task': 'apps.core.tasks.flush_counter_caches',
+        'schedule': 10.0,
+    },
+    'sweep-presence': {
+        'task': 'apps.users.tasks.sweep_presence',
+        'schedule': 60.0,
+    },
+    'reconcile-counters': {
+        'task': 'apps.core.tasks.reconcile_counters',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'maintain-message-partitions': {
+        'task': 'apps.chat.tasks.maintain_message_partitions',
+        'schedule': 6 * 60 * 60.0,
+    },
+    'archive-chat-history': {
+        'task': 'apps.chat.tasks.archive_chat_history',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'refresh-matchmaking-index': {
+        'task': 'apps.users.tasks.refresh_matchmaking_index',
+        'schedule': 60.0,
+    },
+    'refresh-people-suggestions': {
+        'task': 'apps.users.tasks.refresh_people_suggestions',
+        'schedule': 5 * 60.0,
+    },
+    'rebuild-people-suggestions': {
+        'task': 'apps.users.tasks.rebuild_people_suggestions',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'build-community-recommendations': {
+        'task': 'apps.communities.tasks.build_community_recommendations',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'expire-notifications': {
+        'task': 'apps.notifications.tasks.expire_notifications',
+        'schedule': 60 * 60.0,
+    },
+}
@@ -12,7 +12,11 @@ import {
 } from '@heroicons/react/24/outline';
 import { RootState } from '../../store';
 import { logout } from '../../store/slices/authSlice';
-import { fetchNotifications } from '../../store/slices/notificationSlice';
+import {
+  addNotification,
+  fetchNotifications,
+  setUnreadCount,
+} from '../../store/slices/notificationSlice';
 import NotificationDropdown from '../notifications/NotificationDropdown';
 
 const Layout = () => {
@@ -36,6 +40,23 @@ const Layout = () => {
     dispatch(fetchNotifications());
   }, [dispatch]);
   
+  useEffect(() => {
+    if (!user) return;
+    
+    // New notifications and unread counts are pushed by the server
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocol}://${window.location.host}/ws/notifications/`);
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'notification') {
+        dispatch(addNotification(data.notification));
+      }
+      dispatch(setUnreadCount(data.unread_count));
+    };
+    
+    return () => socket.close();
+  }, [dispatch, user]);
+  
   const toggleTheme = () => {
     const newTheme = isDarkMode ? 'light' : 'dark';
     setIsDarkMode(!isDarkMode);
@@ -6,6 +6,7 @@ interface Notification {
   recipient: number;
   notification_type: string;
   message: string;
+  count?: number;
   is_read: boolean;
   created_at: string;
   sender?: {
@@ -63,10 +64,17 @@ const notificationSlice = createSlice({
   initialState,
   reducers: {
     addNotification: (state, action: PayloadAction<Notification>) => {
-      state.notifications.unshift(action.payload);
-      if (!action.payload.is_read) {
+      // Coalesced notifications arrive again with the same id; move them to the top
+      const existing = state.notifications.findIndex((n) => n.id === action.payload.id);
+      if (existing !== -1) {
+        state.notifications.splice(existing, 1);
+      } else if (!action.payload.is_read) {
         state.unreadCount += 1;
       }
+      state.notifications.unshift(action.payload);
+    },
+    setUnreadCount: (state, action: PayloadAction<number>) => {
+      state.unreadCount = action.payload;
     },
     updateUnreadCount: (state) => {
       state.unreadCount = state.notifications.filter(
@@ -119,6 +127,10 @@ const notificationSlice = createSlice({
   },
 });
 
-export const { addNotification, updateUnreadCount, clearNotifications } =
-  notificationSlice.actions;
+export const {
+  addNotification,
+  setUnreadCount,
+  updateUnreadCount,
+  clearNotifications,
+} = notificationSlice.actions;
 export default notificationSlice.reducer; 
\ No newline at end of file